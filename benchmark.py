@@ -0,0 +1,343 @@
+"""
+Benchmark
+----
+Seeded benchmarks for the hot paths of the game: map generation, FOV, pathfinding, rendering and save/load.
+Every scenario runs at several map sizes and entity counts. The timings are written to a JSON file, and an
+earlier file can be given with --compare to see how much each case got faster or slower since then.
+
+Usage: python benchmark.py [--output FILE] [--repeats N] [--seed N] [--compare FILE]
+"""
+import os
+
+# Use the headless libtcod backend unless asked otherwise, set LIBTCOD_HEADLESS=0 to time the native library
+os.environ.setdefault('LIBTCOD_HEADLESS', '1')
+
+import argparse
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from timeit import default_timer
+
+import numpy as np
+
+import libtcodpy as libtcod
+
+from fov_functions import initialize_fov, recompute_fov
+from loader_functions.data_loaders import load_game, save_game
+from loader_functions.entity_templates import get_entity_templates
+from loader_functions.initialize_new_game import get_constants, get_game_variables
+from render_functions import RenderState, render_all
+
+
+MAP_SIZES = [(40, 30), (80, 63), (160, 120)]
+ENTITY_COUNTS = [10, 50, 200]
+
+
+def get_benchmark_constants(width, height):
+    # The game's constants, resized to the map being benchmarked. Rooms are scaled with the map's area.
+    constants = get_constants()
+    area_ratio = float(width * height) / (constants['map_width'] * constants['map_height'])
+
+    constants['map_width'] = width
+    constants['map_height'] = height
+    constants['max_rooms'] = max(int(constants['max_rooms'] * area_ratio), 1)
+    constants['screen_width'] = max(width, constants['bar_width'] + 2)
+    constants['screen_height'] = height + constants['panel_height']
+    constants['panel_y'] = height
+
+    return constants
+
+
+def build_game(width, height, entity_count):
+    # A new game on a map of the given size, where the generated monsters are replaced by exactly entity_count orcs
+    constants = get_benchmark_constants(width, height)
+    player, entities, game_map, message_log, game_state = get_game_variables(constants)
+
+    for monster in [entity for entity in entities if entity.ai]:
+        entities.remove(monster)
+        game_map.remove_entity(monster)
+
+    xs, ys = np.nonzero(~game_map.tiles.blocked)
+    free_cells = [(x, y) for x, y in zip(xs.tolist(), ys.tolist()) if not game_map.get_entities_at(x, y)]
+    random.shuffle(free_cells)
+
+    create_orc = get_entity_templates().monster_factories['orc']
+
+    for x, y in free_cells[:entity_count]:
+        monster = create_orc(x, y)
+        entities.append(monster)
+        game_map.add_entity(monster)
+
+    return constants, player, entities, game_map, message_log, game_state
+
+
+def random_floor_cell(game_map):
+    xs, ys = np.nonzero(~game_map.tiles.blocked)
+    i = random.randrange(len(xs))
+
+    return int(xs[i]), int(ys[i])
+
+
+def bench_mapgen(width, height, entity_count, repeats):
+    # make_map, which also places the monsters and items of every room
+    constants = get_benchmark_constants(width, height)
+    player, entities, game_map, message_log, game_state = get_game_variables(constants)
+    timings = []
+
+    for i in range(repeats):
+        entities = [player]
+        game_map.tiles = game_map.initialize_tiles()
+
+        start = default_timer()
+        game_map.make_map(constants['max_rooms'], constants['room_min_size'], constants['room_max_size'],
+                          width, height, player, entities)
+        timings.append(default_timer() - start)
+
+    return timings, len(entities)
+
+
+def bench_fov(width, height, entity_count, repeats):
+    # initialize_fov once per repeat, and recompute_fov from 20 places on the map
+    constants, player, entities, game_map, message_log, game_state = build_game(width, height, 0)
+    timings = []
+
+    for i in range(repeats):
+        positions = [random_floor_cell(game_map) for j in range(20)]
+
+        start = default_timer()
+        fov_map = initialize_fov(game_map)
+
+        for x, y in positions:
+            recompute_fov(fov_map, x, y, constants['fov_radius'], constants['fov_light_walls'])
+        timings.append(default_timer() - start)
+
+    return timings, len(entities)
+
+
+def bench_astar(width, height, entity_count, repeats):
+    # One turn of move_astar for every monster on the map, all of them chasing the player
+    constants, player, entities, game_map, message_log, game_state = build_game(width, height, entity_count)
+    monsters = [entity for entity in entities if entity.ai]
+    start_positions = [(monster.x, monster.y) for monster in monsters]
+    timings = []
+
+    for i in range(repeats):
+        # Put everyone back where they started, so each repeat does the same work
+        for monster, (x, y) in zip(monsters, start_positions):
+            monster.x, monster.y = x, y
+
+        game_map.index_entities(entities)
+        game_map.initialize_path_map(entities)
+
+        start = default_timer()
+        for monster in monsters:
+            monster.move_astar(player, entities, game_map)
+        timings.append(default_timer() - start)
+
+    return timings, len(entities)
+
+
+def bench_render(width, height, entity_count, repeats):
+    # A full render_all frame into an off-screen console, with the field of view recomputed and a fresh RenderState,
+    # as on a new floor
+    constants, player, entities, game_map, message_log, game_state = build_game(width, height, entity_count)
+
+    libtcod.console_init_root(constants['screen_width'], constants['screen_height'], constants['window_title'],
+                              False)
+    con = libtcod.console_new(constants['screen_width'], constants['screen_height'])
+    panel = libtcod.console_new(constants['screen_width'], constants['panel_height'])
+    fov_map = initialize_fov(game_map)
+    mouse = libtcod.Mouse()
+    timings = []
+
+    for i in range(repeats):
+        x, y = random_floor_cell(game_map)
+        recompute_fov(fov_map, x, y, constants['fov_radius'], constants['fov_light_walls'])
+        libtcod.console_clear(con)
+
+        start = default_timer()
+        render_all(con, panel, player, game_map, fov_map, True, message_log,
+                   constants['screen_width'], constants['screen_height'], constants['bar_width'],
+                   constants['panel_height'], constants['panel_y'], mouse, constants['colors'], game_state,
+                   RenderState(game_map.width, game_map.height))
+        libtcod.console_flush()
+        timings.append(default_timer() - start)
+
+    libtcod.console_delete(con)
+    libtcod.console_delete(panel)
+
+    return timings, len(entities)
+
+
+def bench_render_incremental(width, height, entity_count, repeats):
+    # render_all frames that only redraw what changed, with the player taking one step each frame
+    constants, player, entities, game_map, message_log, game_state = build_game(width, height, entity_count)
+
+    libtcod.console_init_root(constants['screen_width'], constants['screen_height'], constants['window_title'],
+                              False)
+    con = libtcod.console_new(constants['screen_width'], constants['screen_height'])
+    panel = libtcod.console_new(constants['screen_width'], constants['panel_height'])
+    fov_map = initialize_fov(game_map)
+    render_state = RenderState(game_map.width, game_map.height)
+    mouse = libtcod.Mouse()
+    timings = []
+
+    for i in range(repeats + 1):
+        # A random step the player can take, if there is one
+        steps = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                 if (dx or dy) and not game_map.is_blocked(player.x + dx, player.y + dy)
+                 and not game_map.get_blocking_entity_at(player.x + dx, player.y + dy)]
+
+        if steps:
+            player.move(*random.choice(steps), game_map=game_map)
+
+        recompute_fov(fov_map, player.x, player.y, constants['fov_radius'], constants['fov_light_walls'])
+
+        start = default_timer()
+        render_all(con, panel, player, game_map, fov_map, True, message_log,
+                   constants['screen_width'], constants['screen_height'], constants['bar_width'],
+                   constants['panel_height'], constants['panel_y'], mouse, constants['colors'], game_state,
+                   render_state)
+        libtcod.console_flush()
+
+        # The first frame draws everything, so it is not counted
+        if i:
+            timings.append(default_timer() - start)
+
+    libtcod.console_delete(con)
+    libtcod.console_delete(panel)
+
+    return timings, len(entities)
+
+
+def bench_save_load(width, height, entity_count, repeats):
+    # save_game followed by load_game, in a scratch directory so no real save game is touched
+    constants, player, entities, game_map, message_log, game_state = build_game(width, height, entity_count)
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    timings = []
+
+    try:
+        os.chdir(directory)
+
+        for i in range(repeats):
+            start = default_timer()
+            save_game(player, entities, game_map, message_log, game_state)
+            load_game()
+            timings.append(default_timer() - start)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+
+    return timings, len(entities)
+
+
+# Each scenario, and whether it is run at each entity count or only once per map size
+SCENARIOS = [
+    ('mapgen', bench_mapgen, False),
+    ('fov', bench_fov, False),
+    ('astar', bench_astar, True),
+    ('render', bench_render, True),
+    ('render_incremental', bench_render_incremental, True),
+    ('save_load', bench_save_load, True)
+]
+
+
+def summarize(timings):
+    timings = sorted(timings)
+
+    return {
+        'repeats': len(timings),
+        'mean_ms': 1000.0 * sum(timings) / len(timings),
+        'median_ms': 1000.0 * timings[len(timings) // 2],
+        'min_ms': 1000.0 * timings[0],
+        'max_ms': 1000.0 * timings[-1]
+    }
+
+
+def run_benchmarks(repeats=5, seed=0, scenarios=None, map_sizes=None, entity_counts=None):
+    results = []
+
+    for name, bench, per_entity_count in SCENARIOS:
+        if scenarios and name not in scenarios:
+            continue
+
+        for width, height in map_sizes or MAP_SIZES:
+            for entity_count in (entity_counts or ENTITY_COUNTS) if per_entity_count else [None]:
+                # Every case starts from the same seed, so it does the same work from run to run
+                random.seed(seed)
+
+                timings, entities = bench(width, height, entity_count, repeats)
+
+                result = {
+                    'scenario': name,
+                    'map_width': width,
+                    'map_height': height,
+                    'entity_count': entity_count,
+                    'entities': entities
+                }
+                result.update(summarize(timings))
+                results.append(result)
+
+                print('{0:<20} {1:>4}x{2:<4} {3:>5} entities {4:>10.3f} ms'.format(
+                    name, width, height, entities, result['median_ms']))
+
+    return results
+
+
+def case_key(result):
+    return result['scenario'], result['map_width'], result['map_height'], result['entity_count']
+
+
+def compare(results, previous_results):
+    # Median time of every case against the same case in an earlier run; above 1.0 is slower
+    previous = dict((case_key(result), result) for result in previous_results)
+    lines = []
+
+    for result in results:
+        old = previous.get(case_key(result))
+
+        if old:
+            lines.append('{0:<20} {1:>4}x{2:<4} {3:>5} entities {4:>10.3f} ms -> {5:>10.3f} ms  x{6:.2f}'.format(
+                result['scenario'], result['map_width'], result['map_height'], result['entities'],
+                old['median_ms'], result['median_ms'], result['median_ms'] / max(old['median_ms'], 1e-9)))
+
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the hot paths of the game.')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scenario', action='append', dest='scenarios',
+                        help='only run this scenario, can be given more than once')
+    parser.add_argument('--compare', help='an earlier results file to compare against')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.repeats, args.seed, args.scenarios)
+
+    report = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': sys.platform,
+        'headless': libtcod.HEADLESS,
+        'seed': args.seed,
+        'repeats': args.repeats,
+        'results': results
+    }
+
+    with open(args.output, 'w') as output_file:
+        json.dump(report, output_file, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as previous_file:
+            print(compare(results, json.load(previous_file)['results']))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,31 @@
 import libtcodpy as libtcod
-from random import randint
 
 from game_messages import Message
+from slotted import Slotted
+
+class BasicMonster(Slotted):
+    __slots__ = ('owner',)
 
-class BasicMonster:
     def take_turn(self, target, fov_map, game_map, entities):
         results = []
 
         monster = self.owner
-        if libtcod.map_is_in_fov(fov_map, monster.x, monster.y):
+
+        # The monster's own view if the engine worked those out this turn. Otherwise the player's, which is
+        # the same thing, since whoever is in view of the player has the player in view too.
+        if game_map.monster_sight:
+            sees_target = game_map.can_see(monster, target.x, target.y)
+        else:
+            sees_target = fov_map.is_in_fov(monster.x, monster.y)
+
+        if sees_target:
 
             if monster.distance_to(target) >= 2:
-                monster.move_astar(target, entities, game_map)
+                # With the chase field on, all the chasing monsters share one map of the ways to the player
+                if game_map.chase_field:
+                    monster.move_chase_field(target, entities, game_map)
+                else:
+                    monster.move_astar(target, entities, game_map)
 
             elif target.fighter.hp > 0:
                 attack_results = monster.fighter.attack(target)
@@ -19,7 +33,9 @@ class BasicMonster:
 
         return results
 
-class ConfusedMonster:
+class ConfusedMonster(Slotted):
+    __slots__ = ('previous_ai', 'number_of_turns', 'owner')
+
     def __init__(self, previous_ai, number_of_turns=10):
         self.previous_ai = previous_ai
         self.number_of_turns = number_of_turns
@@ -28,8 +44,8 @@ class ConfusedMonster:
         results = []
 
         if self.number_of_turns > 0:
-            random_x = self.owner.x + randint(0, 2) - 1
-            random_y = self.owner.y + randint(0, 2) - 1
+            random_x = self.owner.x + game_map.rng.ai.randint(0, 2) - 1
+            random_y = self.owner.y + game_map.rng.ai.randint(0, 2) - 1
 
             if random_x != self.owner.x and random_y != self.owner.y:
                 self.owner.move_towards(random_x, random_y, game_map, entities)
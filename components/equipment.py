@@ -1,71 +1,91 @@
 from equipment_slots import EquipmentSlots
+from slotted import Slotted
 
 
-class Equipment:
-    def __init__(self, main_hand=None, off_hand=None):
-        self.main_hand = main_hand
-        self.off_hand = off_hand
+class Equipment(Slotted):
+    """
+    What is worn, as slot -> item entity. The bonuses of everything worn are kept as running totals,
+    so reading them costs the same however many slots there are.
+    """
+    __slots__ = ('slots', 'max_hp_bonus', 'power_bonus', 'defense_bonus', 'owner')
 
-    @property
-    def max_hp_bonus(self):
-        bonus = 0
+    def __init__(self, items=()):
+        self.slots = {}
+        self.max_hp_bonus = 0
+        self.power_bonus = 0
+        self.defense_bonus = 0
+        self.owner = None
 
-        if self.main_hand and self.main_hand.equippable:
-            bonus += self.main_hand.equippable.max_hp_bonus
+        for item in items:
+            self.equip(item)
 
-        if self.off_hand and self.off_hand.equippable:
-            bonus += self.off_hand.equippable.max_hp_bonus
+    def __setstate__(self, state):
+        # Save games from before the slot mapping have a main_hand and an off_hand
+        if 'slots' not in state:
+            state = dict(state)
+            slots = {}
 
-        return bonus
+            for slot, name in ((EquipmentSlots.MAIN_HAND, 'main_hand'), (EquipmentSlots.OFF_HAND, 'off_hand')):
+                item = state.pop(name, None)
 
-    @property
-    def power_bonus(self):
-        bonus = 0
+                if item:
+                    slots[slot] = item
 
-        if self.main_hand and self.main_hand.equippable:
-            bonus += self.main_hand.equippable.power_bonus
+            state['slots'] = slots
 
-        if self.off_hand and self.off_hand.equippable:
-            bonus += self.off_hand.equippable.power_bonus
+        Slotted.__setstate__(self, state)
 
-        return bonus
+        if 'max_hp_bonus' not in state:
+            self.update_bonuses()
 
-    @property
-    def defense_bonus(self):
-        bonus = 0
+    def is_equipped(self, item):
+        return item.equippable is not None and self.slots.get(item.equippable.slot) is item
 
-        if self.main_hand and self.main_hand.equippable:
-            bonus += self.main_hand.equippable.defense_bonus
+    def equip(self, item):
+        # Put the item in its slot, in place of what was there
+        equippable = item.equippable
+        current = self.slots.get(equippable.slot)
 
-        if self.off_hand and self.off_hand.equippable:
-            bonus += self.off_hand.equippable.defense_bonus
+        if current:
+            self.unequip(current)
 
-        return bonus
+        self.slots[equippable.slot] = item
+        self.add_bonuses(equippable, 1)
+
+    def unequip(self, item):
+        del self.slots[item.equippable.slot]
+        self.add_bonuses(item.equippable, -1)
+
+    def add_bonuses(self, equippable, sign):
+        self.max_hp_bonus += sign * equippable.max_hp_bonus
+        self.power_bonus += sign * equippable.power_bonus
+        self.defense_bonus += sign * equippable.defense_bonus
+
+    def update_bonuses(self):
+        # Work the totals out again from everything worn
+        self.max_hp_bonus = 0
+        self.power_bonus = 0
+        self.defense_bonus = 0
+
+        for item in self.slots.values():
+            self.add_bonuses(item.equippable, 1)
 
     def toggle_equip(self, equippable_entity):
         results = []
 
-        slot = equippable_entity.equippable.slot
-
-        if slot == EquipmentSlots.MAIN_HAND:
-            if self.main_hand == equippable_entity:
-                self.main_hand = None
-                results.append({'dequipped': equippable_entity})
-            else:
-                if self.main_hand:
-                    results.append({'dequipped': self.main_hand})
-
-                self.main_hand = equippable_entity
-                results.append({'equipped': equippable_entity})
-        elif slot == EquipmentSlots.OFF_HAND:
-            if self.off_hand == equippable_entity:
-                self.off_hand = None
-                results.append({'dequipped': equippable_entity})
-            else:
-                if self.off_hand:
-                    results.append({'dequipped': self.off_hand})
-
-                self.off_hand = equippable_entity
-                results.append({'equipped': equippable_entity})
-
-        return results
\ No newline at end of file
+        current = self.slots.get(equippable_entity.equippable.slot)
+
+        if current == equippable_entity:
+            self.unequip(equippable_entity)
+            results.append({'dequipped': equippable_entity})
+        else:
+            if current:
+                results.append({'dequipped': current})
+
+            self.equip(equippable_entity)
+            results.append({'equipped': equippable_entity})
+
+        if self.owner and self.owner.fighter:
+            self.owner.fighter.update_stats()
+
+        return results
@@ -1,4 +1,9 @@
-class Equippable:
+from slotted import Slotted
+
+
+class Equippable(Slotted):
+    __slots__ = ('slot', 'power_bonus', 'defense_bonus', 'max_hp_bonus', 'owner')
+
     def __init__(self, slot, power_bonus=0, defense_bonus=0, max_hp_bonus=0):
         self.slot = slot
         self.power_bonus = power_bonus
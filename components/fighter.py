@@ -1,42 +1,34 @@
 import libtcodpy as libtcod
 
 from game_messages import Message
+from slotted import Slotted
 
 
-class Fighter:
+class Fighter(Slotted):
+    __slots__ = ('base_max_hp', 'hp', 'base_defense', 'base_power', 'xp', 'max_hp', 'power', 'defense', 'owner')
+
     def __init__(self, hp, defense, power, xp=0):
         self.base_max_hp = hp
         self.hp = hp
         self.base_defense = defense
         self.base_power = power
         self.xp = xp
+        self.owner = None
+        self.update_stats()
 
-    @property
-    def max_hp(self):
+    def update_stats(self):
+        # The stats with the equipment bonuses added in are kept ready to read, and worked out again
+        # whenever the equipment or a base stat changes
         if self.owner and self.owner.equipment:
-            bonus = self.owner.equipment.max_hp_bonus
-        else:
-            bonus = 0
-
-        return self.base_max_hp + bonus
+            equipment = self.owner.equipment
 
-    @property
-    def power(self):
-        if self.owner and self.owner.equipment:
-            bonus = self.owner.equipment.power_bonus
+            self.max_hp = self.base_max_hp + equipment.max_hp_bonus
+            self.power = self.base_power + equipment.power_bonus
+            self.defense = self.base_defense + equipment.defense_bonus
         else:
-            bonus = 0
-
-        return self.base_power + bonus
-
-    @property
-    def defense(self):
-        if self.owner and self.owner.equipment:
-            bonus = self.owner.equipment.defense_bonus
-        else:
-            bonus = 0
-
-        return self.base_defense + bonus
+            self.max_hp = self.base_max_hp
+            self.power = self.base_power
+            self.defense = self.base_defense
 
     def take_damage(self, amount):
         results = []
@@ -1,9 +1,12 @@
 import libtcodpy as libtcod
 
 from game_messages import Message
+from slotted import Slotted
 
 
-class Inventory:
+class Inventory(Slotted):
+    __slots__ = ('capacity', 'items', 'owner')
+
     def __init__(self, capacity):
         self.capacity = capacity
         self.items = []
@@ -62,7 +65,7 @@ class Inventory:
     def drop_item(self, item):
         results = []
 
-        if self.owner.equipment.main_hand == item or self.owner.equipment.off_hand == item:
+        if self.owner.equipment.is_equipped(item):
             self.owner.equipment.toggle_equip(item)
 
         item.x = self.owner.x
@@ -1,4 +1,9 @@
-class Item:
+from slotted import Slotted
+
+
+class Item(Slotted):
+    __slots__ = ('use_function', 'targeting', 'targeting_message', 'use_function_kwargs', 'owner')
+
     def __init__(self, use_function=None, targeting=False, targeting_message=None, **kwargs):
         self.use_function = use_function
         self.targeting = targeting
@@ -1,4 +1,9 @@
-class Level:
+from slotted import Slotted
+
+
+class Level(Slotted):
+    __slots__ = ('current_level', 'current_xp', 'level_up_base', 'level_up_factor', 'owner')
+
     def __init__(self, current_level=1, current_xp=0, level_up_base=200, level_up_factor=150):
         self.current_level = current_level
         self.current_xp = current_xp
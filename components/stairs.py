@@ -1,3 +1,8 @@
-class Stairs:
+from slotted import Slotted
+
+
+class Stairs(Slotted):
+    __slots__ = ('floor', 'owner')
+
     def __init__(self, floor):
         self.floor = floor
\ No newline at end of file
@@ -18,7 +18,7 @@ def kill_player(player):
     return Message('You died!', libtcod.red), GameStates.PLAYER_DEAD
 
 
-def kill_monster(monster):
+def kill_monster(monster, game_map=None):
     death_message = Message('{0} is dead!'.format(monster.name.capitalize()), libtcod.orange)
 
     monster.char = '%'
@@ -29,4 +29,9 @@ def kill_monster(monster):
     monster.name = 'remains of ' + monster.name
     monster.render_order = RenderOrder.CORPSE
 
+    # The remains no longer block the way, and no longer fight or think
+    if game_map:
+        game_map.entity_unblocked(monster)
+        game_map.components_changed(monster)
+
     return death_message
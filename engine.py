@@ -4,18 +4,18 @@ Engine
 The core of our roguelike, where the main loop of our game is housed.
 """
 import libtcodpy as libtcod
-import random
 
 from death_functions import kill_player, kill_monster
-from entity import get_blocking_entities_at_location
-from fov_functions import initialize_fov, recompute_fov
+from fov_functions import FovCache, initialize_fov, recompute_fov
 from game_messages import Message
 from game_states import GameStates
 from input_handlers import handle_keys, handle_mouse, handle_main_menu
+from loader_functions.autosave import Autosaver
 from loader_functions.initialize_new_game import get_constants, get_game_variables
-from loader_functions.data_loaders import load_game, save_game
+from loader_functions.data_loaders import load_game, save_game, save_game_exists
 from menus import main_menu, message_box
-from render_functions import clear_all, render_all
+from render_functions import RenderState, render_all
+from turn_scheduler import get_action_time
 
 
 def main():
@@ -71,6 +71,8 @@ def main():
                 game_state = GameStates.PLAYERS_TURN
 
                 show_main_menu = False
+            elif load_saved_game and not save_game_exists():
+                show_load_error_message = True
             elif load_saved_game:
                 try:
                     player, entities, game_map, message_log, game_state = load_game()
@@ -87,10 +89,30 @@ def main():
             show_main_menu = True
 
 
+def get_fov_cache(game_map, constants):
+    # Remembers the field of view of positions the player has been at, for as long as they stay on this floor
+    if constants['fov_cache_size']:
+        return FovCache(game_map, constants['fov_cache_size'])
+
+    return None
+
+
+def report_autosave_error(autosaver, message_log):
+    # A failed background save is only noticed here, so the player knows the save game is out of date
+    error = autosaver.take_error()
+
+    if error:
+        message_log.add_message(Message('The game could not be saved: {0}'.format(error), libtcod.red))
+
+
 def play_game(player, entities, game_map, message_log, game_state, con, panel, constants):
     # Calculate the Fog of War on the map
     fov_recompute = True
     fov_map = initialize_fov(game_map)
+    fov_cache = get_fov_cache(game_map, constants)
+
+    # Keep track of what is on the map console so only the changes get redrawn
+    render_state = RenderState(game_map.width, game_map.height)
 
     # Set variables to receive both keypresses and mouse movements
     key = libtcod.Key()
@@ -101,6 +123,12 @@ def play_game(player, entities, game_map, message_log, game_state, con, panel, c
 
     targeting_item = None
 
+    # Saves the game in the background every few turns and on every new floor
+    autosaver = Autosaver(constants['autosave_interval'])
+
+    # Start building the floor below while this one is explored
+    game_map.pregenerate_next_floor(constants)
+
     # The Main game loop
     while not libtcod.console_is_window_closed():
         # Wait until a key is pressed
@@ -109,19 +137,18 @@ def play_game(player, entities, game_map, message_log, game_state, con, panel, c
         # Recalculate the field of vision from player coordinates. Only happens when player moves
         if fov_recompute:
             recompute_fov(fov_map, player.x, player.y, constants['fov_radius'], constants['fov_light_walls'],
-                          constants['fov_algorithm'])
+                          fov_cache)
 
         # Draw everything on screen
-        render_all(con, panel, entities, player, game_map, fov_map, fov_recompute, message_log,
+        render_all(con, panel, player, game_map, fov_map, fov_recompute, message_log,
                    constants['screen_width'], constants['screen_height'], constants['bar_width'],
-                   constants['panel_height'], constants['panel_y'], mouse, constants['colors'], game_state)
+                   constants['panel_height'], constants['panel_y'], mouse, constants['colors'], game_state,
+                   render_state)
 
         fov_recompute = False
 
         libtcod.console_flush()
 
-        clear_all(con, entities)
-
         # Define actions
         action = handle_keys(key, game_state)
         mouse_action = handle_mouse(mouse)
@@ -150,7 +177,7 @@ def play_game(player, entities, game_map, message_log, game_state, con, panel, c
             destination_y = player.y + dy
 
             if not game_map.is_blocked(destination_x, destination_y):
-                target = get_blocking_entities_at_location(entities, destination_x, destination_y)
+                target = game_map.get_blocking_entity_at(destination_x, destination_y)
 
                 # If the square contained an enemy, attack it
                 if target:
@@ -158,7 +185,7 @@ def play_game(player, entities, game_map, message_log, game_state, con, panel, c
                     player_turn_results.extend(attack_results)
                 # Otherwise, move into the square and recalculate Field of Vision
                 else:
-                    player.move(dx, dy)
+                    player.move(dx, dy, game_map)
 
                     fov_recompute = True
 
@@ -167,16 +194,16 @@ def play_game(player, entities, game_map, message_log, game_state, con, panel, c
 
         # Player tries to pick up an item
         elif pickup and game_state == GameStates.PLAYERS_TURN:
-            for entity in entities:
+            for entity in game_map.get_entities_at(player.x, player.y):
                 # If there is an item at the coordinates, try to add it to inventory. If full, fail at that
-                if entity.item and entity.x == player.x and entity.y == player.y:
+                if entity.item:
                     pickup_results = player.inventory.add_item(entity)
                     player_turn_results.extend(pickup_results)
 
                     break
             # Player tried to pick up empty space
             else:
-                if random.randint(0, 100) >= 99:
+                if game_map.rng.flavor.randint(0, 100) >= 99:
                     message_log.add_message(
                         Message('You daintly pick up a handful of musty air and stuff it in your pocket.',
                                 libtcod.yellow))
@@ -203,7 +230,8 @@ def play_game(player, entities, game_map, message_log, game_state, con, panel, c
             item = player.inventory.items[inventory_index]
 
             if game_state == GameStates.SHOW_INVENTORY:
-                player_turn_results.extend(player.inventory.use(item, entities=entities, fov_map=fov_map))
+                player_turn_results.extend(player.inventory.use(item, entities=entities, fov_map=fov_map,
+                                                                    game_map=game_map))
             elif game_state == GameStates.DROP_INVENTORY:
                 player_turn_results.extend(player.inventory.drop_item(item))
 
@@ -212,12 +240,22 @@ def play_game(player, entities, game_map, message_log, game_state, con, panel, c
         generate a new level, reset the map and seen squares, and clear the console
         """
         if take_stairs and game_state == GameStates.PLAYERS_TURN:
-            for entity in entities:
-                if entity.stairs and entity.x == player.x and entity.y == player.y:
+            for entity in game_map.get_entities_at(player.x, player.y):
+                if entity.stairs:
                     entities = game_map.next_floor(player, message_log, constants)
-                    fov_map = initialize_fov(game_map)
+
+                    # A floor built in the background comes with its FOV map
+                    fov_map = game_map.take_prebuilt_fov_map()
+                    if fov_map is None:
+                        fov_map = initialize_fov(game_map)
+
+                    fov_cache = get_fov_cache(game_map, constants)
                     fov_recompute = True
                     libtcod.console_clear(con)
+                    render_state = RenderState(game_map.width, game_map.height)
+
+                    autosaver.save(player, entities, game_map, message_log, game_state)
+                    report_autosave_error(autosaver, message_log)
 
                     break
             else:
@@ -233,6 +271,8 @@ def play_game(player, entities, game_map, message_log, game_state, con, panel, c
             elif level_up == 'def':
                 player.fighter.base_defense += 1
 
+            player.fighter.update_stats()
+
             game_state = previous_game_state
 
         # Showing character screen
@@ -250,7 +290,7 @@ def play_game(player, entities, game_map, message_log, game_state, con, panel, c
                 target_x, target_y = left_click
 
                 item_use_results = player.inventory.use(targeting_item, entities=entities, fov_map=fov_map,
-                                                        target_x=target_x, target_y=target_y)
+                                                        game_map=game_map, target_x=target_x, target_y=target_y)
                 player_turn_results.extend(item_use_results)
             elif right_click:
                 player_turn_results.append({'targeting_cancelled': True})
@@ -262,6 +302,9 @@ def play_game(player, entities, game_map, message_log, game_state, con, panel, c
             elif game_state == GameStates.TARGETING:
                 player_turn_results.append({'targeting_cancelled': True})
             else:
+                # Let a background save finish first, so it cannot overwrite this one
+                autosaver.stop()
+                game_map.wait_for_pregeneration()
                 save_game(player, entities, game_map, message_log, game_state)
 
                 return True
@@ -291,13 +334,14 @@ def play_game(player, entities, game_map, message_log, game_state, con, panel, c
                 if dead_entity == player:
                     message, game_state = kill_player(dead_entity)
                 else:
-                    message = kill_monster(dead_entity)
+                    message = kill_monster(dead_entity, game_map)
 
                 message_log.add_message(message)
 
             # If the player picked up an item, remove it from the world
             if item_added:
                 entities.remove(item_added)
+                game_map.remove_entity(item_added)
 
                 game_state = GameStates.ENEMY_TURN
 
@@ -309,6 +353,7 @@ def play_game(player, entities, game_map, message_log, game_state, con, panel, c
             # If an item was dropped, add it to the game world
             if item_dropped:
                 entities.append(item_dropped)
+                game_map.add_entity(item_dropped)
 
                 game_state = GameStates.ENEMY_TURN
 
@@ -358,38 +403,55 @@ def play_game(player, entities, game_map, message_log, game_state, con, panel, c
 
         # The enemy turn
         if game_state == GameStates.ENEMY_TURN:
-            # Go through all entities in the list
-            for entity in entities:
-                # If it has an AI, make a move
-                if entity.ai:
-                    enemy_turn_results = entity.ai.take_turn(player, fov_map, game_map, entities)
-
-                    # Handle all the messages from entities
-                    for enemy_turn_result in enemy_turn_results:
-                        message = enemy_turn_result.get('message')
-                        dead_entity = enemy_turn_result.get('dead')
-
-                        # If there's a message, log it
-                        if message:
-                            message_log.add_message(message)
-
-                        # If something died, make that happen
-                        if dead_entity:
-                            if dead_entity == player:
-                                message, game_state = kill_player(dead_entity)
-                            else:
-                                message = kill_monster(dead_entity)
-
-                            message_log.add_message(message)
-
-                            if game_state == GameStates.PLAYER_DEAD:
-                                break
-
-                    if game_state == GameStates.PLAYER_DEAD:
-                        break
+            # In chase field mode, the distances to the player are shared by all the monsters
+            if constants['chase_field']:
+                game_map.set_chase_goal(player.x, player.y)
+
+            # Monsters far from the player sleep through the enemy turn, the ones that got close wake up
+            if constants['activity_radius']:
+                game_map.update_activity(player.x, player.y, constants['activity_radius'])
+
+            # The awake monsters look around for themselves, all in one go
+            if constants['monster_sight']:
+                game_map.compute_monster_sight(constants['fov_radius'], constants['fov_light_walls'])
+
+            # Every monster whose action is due before the player's next one makes a move
+            for entity in game_map.scheduler.take_turns(get_action_time(player)):
+                enemy_turn_results = entity.ai.take_turn(player, fov_map, game_map, entities)
+
+                # Handle all the messages from entities
+                for enemy_turn_result in enemy_turn_results:
+                    message = enemy_turn_result.get('message')
+                    dead_entity = enemy_turn_result.get('dead')
+
+                    # If there's a message, log it
+                    if message:
+                        message_log.add_message(message)
+
+                    # If something died, make that happen
+                    if dead_entity:
+                        if dead_entity == player:
+                            message, game_state = kill_player(dead_entity)
+                        else:
+                            message = kill_monster(dead_entity, game_map)
+
+                        message_log.add_message(message)
+
+                        if game_state == GameStates.PLAYER_DEAD:
+                            break
+
+                if game_state == GameStates.PLAYER_DEAD:
+                    break
             else:
                 game_state = GameStates.PLAYERS_TURN
 
+                autosaver.turn_taken(player, entities, game_map, message_log, game_state)
+                report_autosave_error(autosaver, message_log)
+
+    # The window was closed, make sure the last autosave made it to disk
+    autosaver.stop()
+    game_map.wait_for_pregeneration()
+
 
 if __name__ == '__main__':
     main()
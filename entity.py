@@ -8,13 +8,19 @@ import math
 import libtcodpy as libtcod
 
 from render_functions import RenderOrder
+from turn_scheduler import NORMAL_SPEED
 
 from components.item import Item
+from slotted import Slotted
 
 
-class Entity:
+class Entity(Slotted):
+    __slots__ = ('x', 'y', 'char', 'color', 'name', 'blocks', 'render_order', 'fighter', 'ai', 'item', 'inventory',
+                 'stairs', 'level', 'equipment', 'equippable', 'speed')
+
     def __init__(self, x, y, char, color, name, blocks=False, render_order=RenderOrder.CORPSE, fighter=None, ai=None,
-                 item=None, inventory=None, stairs=None, level=None, equipment=None, equippable=None):
+                 item=None, inventory=None, stairs=None, level=None, equipment=None, equippable=None,
+                 speed=NORMAL_SPEED):
         self.x = x
         self.y = y
         self.char = char
@@ -30,6 +36,7 @@ class Entity:
         self.level = level
         self.equipment = equipment
         self.equippable = equippable
+        self.speed = speed
 
         if self.fighter:
             self.fighter.owner = self
@@ -52,6 +59,10 @@ class Entity:
         if self.equipment:
             self.equipment.owner = self
 
+            # The fighter's stats count whatever the entity starts out wearing
+            if self.fighter:
+                self.fighter.update_stats()
+
         if self.equippable:
             self.equippable.owner = self
 
@@ -60,12 +71,22 @@ class Entity:
                 self.item = item
                 self.item.owner = self
 
-    def move(self, dx, dy):
+    def __setstate__(self, state):
+        Slotted.__setstate__(self, state)
+
+        # Save games from before entities had a speed
+        self.speed = state.get('speed', NORMAL_SPEED)
+
+    def move(self, dx, dy, game_map=None):
 
         # Move the entity by a given amount
         self.x += dx
         self.y += dy
 
+        # Let the map keep its path map up to date
+        if game_map:
+            game_map.entity_moved(self, self.x - dx, self.y - dy)
+
     def move_towards(self, target_x, target_y, game_map, entities):
 
         dx = target_x - self.x
@@ -77,8 +98,8 @@ class Entity:
         dy = int(round(dy / distance))
 
         if not (game_map.is_blocked(self.x + dx, self.y + dy) or
-                    get_blocking_entities_at_location(entities, self.x + dx, self.y + dy)):
-            self.move(dx, dy)
+                    game_map.get_blocking_entity_at(self.x + dx, self.y + dy)):
+            self.move(dx, dy, game_map)
 
     def distance(self, x, y):
         return math.sqrt((x - self.x) ** 2 + (y - self.y) ** 2)
@@ -89,26 +110,20 @@ class Entity:
         return math.sqrt(dx ** 2 + dy ** 2)
 
     def move_astar(self, target, entities, game_map):
-        # Create a FOV map that has the dimensions of the map
-        fov = libtcod.map_new(game_map.width, game_map.height)
+        # All monsters share the floor's path map, where the walls and every blocking entity are unwalkable
+        if not game_map.path_map:
+            game_map.initialize_path_map(entities)
 
-        # Scan the current map each turn and set all the walls as unwalkable
-        for y1 in range(game_map.height):
-            for x1 in range(game_map.width):
-                libtcod.map_set_properties(fov, x1, y1, not game_map.tiles[x1][y1].block_sight,
-                                           not game_map.tiles[x1][y1].blocked)
+        path_map = game_map.path_map
 
-        # Scan all the objects to see if there are objects that must be navigated around
-        # Check also that the object isn't self or the target (so that the start and the end points are free)
+        # Free the cells of self and the target for this search only, so that the start and the end points are free
         # The AI class handles the situation if self is next to the target so it will not use this A* function anyway
-        for entity in entities:
-            if entity.blocks and entity != self and entity != target:
-                # Set the tile as a wall so it must be navigated around
-                libtcod.map_set_properties(fov, entity.x, entity.y, True, False)
+        game_map.update_path_cell(self.x, self.y, False)
+        game_map.update_path_cell(target.x, target.y, False)
 
         # Allocate a A* path
         # The 1.41 is the normal diagonal cost of moving, it can be set as 0.0 if diagonal moves are prohibited
-        my_path = libtcod.path_new_using_map(fov, 1.41)
+        my_path = libtcod.path_new_using_map(path_map, 1.41)
 
         # Compute the path between self's coordinates and the target's coordinates
         libtcod.path_compute(my_path, self.x, self.y, target.x, target.y)
@@ -116,25 +131,52 @@ class Entity:
         # Check if the path exists, and in this case, also the path is shorter than 25 tiles
         # The path size matters if you want the monster to use alternative longer paths (for example through other rooms) if for example the player is in a corridor
         # It makes sense to keep path size relatively low to keep the monsters from running around the map if there's an alternative path really far away
-        if not libtcod.path_is_empty(my_path) and libtcod.path_size(my_path) < 25:
+        path_found = not libtcod.path_is_empty(my_path) and libtcod.path_size(my_path) < 25
+
+        if path_found:
             # Find the next coordinates in the computed full path
             x, y = libtcod.path_walk(my_path, True)
+
+        # Delete the path to free memory, and put self and the target back on the path map
+        libtcod.path_delete(my_path)
+        game_map.update_path_cell(self.x, self.y, self.blocks)
+        game_map.update_path_cell(target.x, target.y, target.blocks)
+
+        if path_found:
             if x or y:
-                # Set self's coordinates to the next path tile
-                self.x = x
-                self.y = y
+                # Move self to the next path tile
+                self.move(x - self.x, y - self.y, game_map)
         else:
             # Keep the old move function as a backup so that if there are no paths (for example another monster blocks a corridor)
             # it will still try to move towards the player (closer to the corridor opening)
             self.move_towards(target.x, target.y, game_map, entities)
 
-            # Delete the path to free memory
-        libtcod.path_delete(my_path)
+    def move_chase_field(self, target, entities, game_map):
+        chase_field = game_map.chase_field
+        distance = chase_field.distance(self.x, self.y)
+
+        # Same limit as move_astar: only follow paths shorter than 25 tiles, otherwise just head towards the target
+        if distance < 0 or distance >= 25:
+            self.move_towards(target.x, target.y, game_map, entities)
+            return
+
+        # Step onto the free neighbouring cell that is closest to the target along the field
+        best_step = None
+        best_key = None
+
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                x = self.x + dx
+                y = self.y + dy
+                step_distance = chase_field.distance(x, y)
 
+                if 0 <= step_distance < distance and not game_map.get_blocking_entity_at(x, y):
+                    # On equal distances, prefer the step that looks most direct
+                    key = (step_distance, (target.x - x) ** 2 + (target.y - y) ** 2)
 
-def get_blocking_entities_at_location(entities, destination_x, destination_y):
-    for entity in entities:
-        if entity.blocks and entity.x == destination_x and entity.y == destination_y:
-            return entity
+                    if best_key is None or key < best_key:
+                        best_step = (dx, dy)
+                        best_key = key
 
-    return None
+        if best_step:
+            self.move(best_step[0], best_step[1], game_map)
@@ -7,3 +7,9 @@ from game_states import enum
 
 EquipmentSlots = enum(MAIN_HAND=1,
                       OFF_HAND=2)
+
+# How each slot is shown in the inventory
+SLOT_NAMES = {
+    EquipmentSlots.MAIN_HAND: 'main hand',
+    EquipmentSlots.OFF_HAND: 'off hand'
+}
@@ -1,21 +1,334 @@
 """
 FoV Functions
 ----
-For all the Field of Vision calculating needs, here are the two required
+For all the Field of Vision calculating needs, here are the two required,
+plus a version for many viewers at once and a cache of past results. The field of view is worked out in Python with
+symmetric shadowcasting, a whole row of a quadrant at a time, and kept as a
+boolean array, so checking a cell is plain array indexing.
 """
-import libtcodpy as libtcod
+from collections import OrderedDict
 
+import numpy as np
+
+
+class FovMap:
+    """
+    What blocks sight on the map and what is currently in view, as boolean arrays indexed [x, y]
+    like the game's own tile arrays. A FOV map made for a game map follows changes to its tiles.
+    """
+    def __init__(self, width, height, game_map=None):
+        self.width = width
+        self.height = height
+        self.transparent = np.zeros((width, height), dtype=bool)
+        self.visible = np.zeros((width, height), dtype=bool)
+        self.game_map = game_map
+        self.tiles_version = None
+
+    def update_transparency(self):
+        # Read what blocks sight from the map again if its tiles changed since the last time
+        if self.game_map is not None and self.game_map.tiles_version != self.tiles_version:
+            self.transparent[:] = ~self.game_map.tiles.block_sight
+            self.tiles_version = self.game_map.tiles_version
+
+    def is_in_fov(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height and self.visible.item(x, y)
 
-def initialize_fov(game_map):
-    fov_map = libtcod.map_new(game_map.width, game_map.height)
 
-    for y in range(game_map.height):
-        for x in range(game_map.width):
-            libtcod.map_set_properties(fov_map, x, y, not game_map.tiles[x][y].block_sight,
-                                       not game_map.tiles[x][y].blocked)
+def initialize_fov(game_map):
+    fov_map = FovMap(game_map.width, game_map.height, game_map)
+    fov_map.update_transparency()
 
     return fov_map
 
 
-def recompute_fov(fov_map, x, y, radius, light_walls=True, algorithm=0):
-    libtcod.map_compute_fov(fov_map, x, y, radius, light_walls, algorithm)
+def recompute_fov(fov_map, x, y, radius, light_walls=True, fov_cache=None):
+    fov_map.update_transparency()
+
+    if fov_cache is not None:
+        fov_map.visible = fov_cache.recompute(fov_map, x, y, radius, light_walls)
+    else:
+        fov_map.visible = compute_fov(fov_map.transparent, x, y, radius, light_walls)
+
+    return fov_map.visible
+
+
+def compute_fov(transparent, x, y, radius=0, light_walls=True):
+    """
+    The cells in view from (x, y), as a new boolean array the shape of transparent. A radius of 0 means no limit.
+    The shadowcasting is symmetric: if one cell is in view from another, that one is in view from the first too.
+    Walls that block the view are only counted as in view if light_walls is set.
+    """
+    width, height = transparent.shape
+    visible = np.zeros((width, height), dtype=bool)
+    visible[x, y] = True
+
+    max_depth = radius if radius > 0 else max(width, height)
+
+    # Each quadrant as views of the two arrays where the first axis leads away from (x, y),
+    # and the index along the second axis that (x, y) is at
+    quadrants = ((transparent[x:], visible[x:], y),
+                 (transparent[x::-1], visible[x::-1], y),
+                 (transparent.T[y:], visible.T[y:], x),
+                 (transparent.T[y::-1], visible.T[y::-1], x))
+
+    for rows, lit_rows, origin in quadrants:
+        scan_quadrant(rows, lit_rows, origin, max_depth, light_walls)
+
+    # The rows only reach radius cells out, the corners of that square are cut off here
+    if radius > 0:
+        x1, x2 = max(x - radius, 0), min(x + radius + 1, width)
+        y1, y2 = max(y - radius, 0), min(y + radius + 1, height)
+        dx = np.arange(x1, x2) - x
+        dy = np.arange(y1, y2) - y
+
+        visible[x1:x2, y1:y2] &= dx[:, np.newaxis] ** 2 + dy[np.newaxis, :] ** 2 <= radius * radius
+
+    return visible
+
+
+def scan_quadrant(rows, lit_rows, origin, max_depth, light_walls):
+    # Each span still in view is a start and end slope, both kept as integer fractions (numerator, denominator)
+    # so the columns of a row come out exact. A span is split wherever a row has walls in it.
+    row_width = rows.shape[1]
+    spans = [(-1, 1, 1, 1)]
+
+    for depth in range(1, min(max_depth, len(rows) - 1) + 1):
+        row = rows[depth]
+        lit_row = lit_rows[depth]
+        next_spans = []
+
+        for start_num, start_den, end_num, end_den in spans:
+            # The columns the span covers, rounding ties towards the middle of the span
+            low = max((2 * depth * start_num + start_den) // (2 * start_den) + origin, 0)
+            high = min(-((end_den - 2 * depth * end_num) // (2 * end_den)) + origin, row_width - 1)
+
+            if low > high:
+                continue
+
+            # A floor cell is only in view if its centre is within the span, which is what makes this symmetric.
+            # Those are the columns from centre_low to centre_high.
+            centre_low = max(-((-depth * start_num) // start_den) + origin, low)
+            centre_high = min((depth * end_num) // end_den + origin, high)
+
+            floor = row[low:high + 1]
+
+            if light_walls:
+                lit_row[low:high + 1] |= ~floor
+                lit_row[centre_low:centre_high + 1] = True
+            else:
+                lit_row[centre_low:centre_high + 1] |= floor[centre_low - low:centre_high - low + 1]
+
+            # Every run of floor cells carries on as a narrower span in the next row
+            changes = (np.flatnonzero(floor[1:] != floor[:-1]) + 1).tolist()
+            edges = [0] + changes + [len(floor)]
+
+            for i in range(0 if floor.item(0) else 1, len(edges) - 1, 2):
+                if i > 0:
+                    start = (2 * (low + edges[i] - origin) - 1, 2 * depth)
+                else:
+                    start = (start_num, start_den)
+
+                if i < len(edges) - 2:
+                    end = (2 * (low + edges[i + 1] - origin) - 1, 2 * depth)
+                else:
+                    end = (end_num, end_den)
+
+                next_spans.append(start + end)
+
+        spans = next_spans
+
+        if not spans:
+            break
+
+
+# How each quadrant turns a step in depth and a step along the row into x and y:
+# (x per depth, x per column, y per depth, y per column) for east, west, south and north
+QUADRANT_STEPS = np.array([[1, 0, 0, 1],
+                           [-1, 0, 0, 1],
+                           [0, 1, 1, 0],
+                           [0, 1, -1, 0]])
+
+
+def compute_fov_batch(transparent, viewers, radius, light_walls=True):
+    """
+    The fields of view of many viewers at once, the same as compute_fov would give for each of them.
+    Every span of every viewer is worked on together, one row depth at a time, so the number of array
+    operations does not grow with the number of viewers. The radius has to be at least 1.
+    Returns a boolean array [viewer, dx + radius, dy + radius] of whether each viewer sees the cell (dx, dy) away.
+    """
+    width, height = transparent.shape
+    size = 2 * radius + 1
+    visible = np.zeros((len(viewers), size, size), dtype=bool)
+
+    if not viewers:
+        return visible
+
+    viewer_x = np.array([x for x, y in viewers])
+    viewer_y = np.array([y for x, y in viewers])
+
+    # The map inside a border of walls as wide as the radius, so nobody looks past its edges
+    padded = np.zeros((width + 2 * radius, height + 2 * radius), dtype=bool)
+    padded[radius:radius + width, radius:radius + height] = transparent
+
+    # One span per quadrant per viewer to start with, each covering the whole quadrant
+    span_viewer = np.repeat(np.arange(len(viewers)), 4)
+    span_quadrant = np.tile(np.arange(4), len(viewers))
+    start_num = -np.ones(len(span_viewer), dtype=int)
+    start_den = np.ones(len(span_viewer), dtype=int)
+    end_num = np.ones(len(span_viewer), dtype=int)
+    end_den = np.ones(len(span_viewer), dtype=int)
+
+    for depth in range(1, radius + 1):
+        # The columns of every span in this row, as in scan_quadrant, laid out one span after the other
+        low = (2 * depth * start_num + start_den) // (2 * start_den)
+        high = -((end_den - 2 * depth * end_num) // (2 * end_den))
+        lengths = np.maximum(high - low + 1, 0)
+
+        if not lengths.any():
+            break
+
+        span = np.repeat(np.arange(len(lengths)), lengths)
+        position = np.arange(len(span)) - (np.cumsum(lengths) - lengths)[span]
+        col = low[span] + position
+
+        viewer = span_viewer[span]
+        steps = QUADRANT_STEPS[span_quadrant[span]]
+        dx = steps[:, 0] * depth + steps[:, 1] * col
+        dy = steps[:, 2] * depth + steps[:, 3] * col
+
+        floor = padded[viewer_x[viewer] + radius + dx, viewer_y[viewer] + radius + dy]
+        centred = (col * start_den[span] >= depth * start_num[span]) & (col * end_den[span] <= depth * end_num[span])
+
+        if light_walls:
+            lit = centred | ~floor
+        else:
+            lit = centred & floor
+
+        visible[viewer[lit], dx[lit] + radius, dy[lit] + radius] = True
+
+        # Every run of floor cells carries on as a span in the next row
+        first = position == 0
+        last = position == lengths[span] - 1
+        floor_before = np.concatenate(([False], floor[:-1]))
+        floor_after = np.concatenate((floor[1:], [False]))
+
+        run_starts = np.flatnonzero(floor & (first | ~floor_before))
+        run_ends = np.flatnonzero(floor & (last | ~floor_after))
+        start_span = span[run_starts]
+        end_span = span[run_ends]
+
+        start_num, start_den = (np.where(first[run_starts], start_num[start_span], 2 * col[run_starts] - 1),
+                                np.where(first[run_starts], start_den[start_span], 2 * depth))
+        end_num, end_den = (np.where(last[run_ends], end_num[end_span], 2 * col[run_ends] + 1),
+                            np.where(last[run_ends], end_den[end_span], 2 * depth))
+        span_viewer = span_viewer[start_span]
+        span_quadrant = span_quadrant[start_span]
+
+        if not len(span_viewer):
+            break
+
+    # Cut off the corners past the radius, and the border around the map
+    offsets = np.arange(-radius, radius + 1)
+    visible &= offsets[:, np.newaxis] ** 2 + offsets[np.newaxis, :] ** 2 <= radius * radius
+
+    cell_x = viewer_x[:, np.newaxis] + offsets
+    cell_y = viewer_y[:, np.newaxis] + offsets
+    visible &= ((cell_x >= 0) & (cell_x < width))[:, :, np.newaxis]
+    visible &= ((cell_y >= 0) & (cell_y < height))[:, np.newaxis, :]
+
+    visible[:, radius, radius] = True
+
+    return visible
+
+
+class BatchFov:
+    """
+    What each of a group of entities can see, all computed in one go with compute_fov_batch.
+    An entity that has moved since, or was not in the group, gets its view worked out on its own when asked.
+    """
+    def __init__(self, transparent, viewers, radius, light_walls=True):
+        self.transparent = transparent
+        self.radius = radius
+        self.light_walls = light_walls
+        self.positions = [(viewer.x, viewer.y) for viewer in viewers]
+        self.indices = dict((viewer, index) for index, viewer in enumerate(viewers))
+        self.visible = compute_fov_batch(transparent, self.positions, radius, light_walls)
+
+    def can_see(self, viewer, x, y):
+        dx, dy = x - viewer.x, y - viewer.y
+
+        if abs(dx) > self.radius or abs(dy) > self.radius:
+            return False
+
+        index = self.indices.get(viewer)
+
+        if index is None or self.positions[index] != (viewer.x, viewer.y):
+            view = compute_fov_batch(self.transparent, [(viewer.x, viewer.y)], self.radius, self.light_walls)
+
+            if index is None:
+                index = len(self.positions)
+                self.indices[viewer] = index
+                self.positions.append((viewer.x, viewer.y))
+                self.visible = np.concatenate((self.visible, view))
+            else:
+                self.positions[index] = (viewer.x, viewer.y)
+                self.visible[index] = view[0]
+
+        return self.visible.item(index, dx + self.radius, dy + self.radius)
+
+
+class FovCache:
+    """
+    Past recompute_fov results for one FOV map, so coming back to a position does not compute its FOV again.
+    Each result is kept as a packed bitmask of the square around the position that the radius can reach,
+    and the least recently used ones are dropped first. Changing the map's tiles empties the cache.
+    """
+    def __init__(self, game_map, capacity=256):
+        self.game_map = game_map
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.tiles_version = game_map.tiles_version
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self.tiles_version = self.game_map.tiles_version
+
+    def recompute(self, fov_map, x, y, radius, light_walls=True):
+        if self.game_map.tiles_version != self.tiles_version:
+            self.clear()
+
+        width, height = fov_map.width, fov_map.height
+        key = (x, y, radius, light_walls)
+        entry = self.entries.pop(key, None)
+
+        if entry is None:
+            self.misses += 1
+
+            visible = compute_fov(fov_map.transparent, x, y, radius, light_walls)
+
+            # A radius of 0 means the whole map can be in view
+            if radius > 0:
+                x1, x2 = max(x - radius, 0), min(x + radius + 1, width)
+                y1, y2 = max(y - radius, 0), min(y + radius + 1, height)
+            else:
+                x1, y1, x2, y2 = 0, 0, width, height
+
+            entry = (x1, y1, x2, y2, np.packbits(visible[x1:x2, y1:y2]))
+        else:
+            self.hits += 1
+
+            x1, y1, x2, y2, bits = entry
+            visible = np.zeros((width, height), dtype=bool)
+            visible[x1:x2, y1:y2] = np.unpackbits(bits)[:(x2 - x1) * (y2 - y1)].reshape(x2 - x1, y2 - y1)
+
+        self.entries[key] = entry
+
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+        return visible
@@ -7,8 +7,12 @@ import libtcodpy as libtcod
 
 import textwrap
 
+from slotted import Slotted
+
+
+class Message(Slotted):
+    __slots__ = ('text', 'color')
 
-class Message:
     def __init__(self, text, color=libtcod.white):
         self.text = text
         self.color = color
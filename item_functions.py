@@ -39,7 +39,7 @@ on our characters Field of View and hits it with lightning
 
 def cast_lightning(*args, **kwargs):
     caster = args[0]
-    entities = kwargs.get('entities')
+    game_map = kwargs.get('game_map')
     fov_map = kwargs.get('fov_map')
     damage = kwargs.get('damage')
     maximum_range = kwargs.get('maximum_range')
@@ -49,9 +49,9 @@ def cast_lightning(*args, **kwargs):
     target = None
     closest_distance = maximum_range + 1
 
-    # Go through entities, find the nearest in fov that has a fighter component and zap it with damage
-    for entity in entities:
-        if entity.fighter and entity != caster and libtcod.map_is_in_fov(fov_map, entity.x, entity.y):
+    # Go through the entities with a fighter component, find the nearest in fov and zap it with damage
+    for entity in game_map.get_entities_with('fighter'):
+        if entity != caster and fov_map.is_in_fov(entity.x, entity.y):
             distance = caster.distance_to(entity)
 
             if distance < closest_distance:
@@ -77,7 +77,7 @@ damages everything around it, including the player.
 
 
 def cast_fireball(*args, **kwargs):
-    entities = kwargs.get('entities')
+    game_map = kwargs.get('game_map')
     fov_map = kwargs.get('fov_map')
     damage = kwargs.get('damage')
     radius = kwargs.get('radius')
@@ -87,7 +87,7 @@ def cast_fireball(*args, **kwargs):
     results = []
 
     # Require that the player see what they're trying to scorch
-    if not libtcod.map_is_in_fov(fov_map, target_x, target_y):
+    if not fov_map.is_in_fov(target_x, target_y):
         results.append({'consumed': False,
                         'message': Message('You cannot target a tile outside your field of view.', libtcod.yellow)})
         return results
@@ -96,12 +96,11 @@ def cast_fireball(*args, **kwargs):
                     'message': Message('The fireball explodes, burning everything within {0} tiles!'.format(radius),
                                        libtcod.orange)})
 
-    # Go through the entities and if it has a fighter component and it's close enough, burn it
-    for entity in entities:
-        if entity.distance(target_x, target_y) <= radius and entity.fighter:
-            results.append({'message': Message('The {0} gets burned for {1} hit points.'.format(entity.name, damage),
-                                               libtcod.orange)})
-            results.extend(entity.fighter.take_damage(damage))
+    # Burn everything with a fighter component that is close enough
+    for entity in game_map.get_entities_near(target_x, target_y, radius, 'fighter'):
+        results.append({'message': Message('The {0} gets burned for {1} hit points.'.format(entity.name, damage),
+                                           libtcod.orange)})
+        results.extend(entity.fighter.take_damage(damage))
 
     return results
 
@@ -114,21 +113,21 @@ cast confusion on it, resulting in its AI wandering in random patterns for 10 tu
 
 
 def cast_confuse(*args, **kwargs):
-    entities = kwargs.get('entities')
+    game_map = kwargs.get('game_map')
     fov_map = kwargs.get('fov_map')
     target_x = kwargs.get('target_x')
     target_y = kwargs.get('target_y')
 
     results = []
 
-    if not libtcod.map_is_in_fov(fov_map, target_x, target_y):
+    if not fov_map.is_in_fov(target_x, target_y):
         results.append({'consumed': False,
                         'message': Message('You cannot target a tile outside your field of view.', libtcod.yellow)})
         return results
 
     # Find an entity that is under the mouse cursos
-    for entity in entities:
-        if entity.x == target_x and entity.y == target_y and entity.ai:
+    for entity in game_map.get_entities_at(target_x, target_y):
+        if entity.ai:
             # Make the entity confused for 10 turns
             confused_ai = ConfusedMonster(entity.ai, 10)
 
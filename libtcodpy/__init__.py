@@ -133,59 +133,93 @@ def _get_cdll(libname):
                 sys.exit(1)
             return ctypes.cdll[libPath]
 
-    raise Exception("unable to locate: "+ libname)
-
-if sys.platform.find('linux') != -1:
-    _lib = _get_cdll('libtcod.so')
-    LINUX=True
-elif sys.platform.find('darwin') != -1:
-    _lib = _get_cdll('libtcod.dylib')
-    MAC = True
-elif sys.platform.find('haiku') != -1:
-    _lib = _get_cdll('libtcod.so')
-    HAIKU = True
+    raise LibraryNotFoundError("unable to locate: "+ libname)
+
+class LibraryNotFoundError(Exception):
+    # The native library file is not in any of the places _get_cdll looks
+    pass
+
+class _MissingLibrary(object):
+    # Stands in for the native library when it cannot be loaded. The ctypes declarations below
+    # can still be made on it, and the functions the headless backend does not provide fail when called.
+    def __getattr__(self, name):
+        function = _MissingFunction(name)
+        setattr(self, name, function)
+        return function
+
+
+class _MissingFunction(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, *args):
+        raise NotImplementedError(self.name + ' is not available in the headless libtcod backend')
+
+
+# Set LIBTCOD_HEADLESS=1 to use the headless backend even when the native library is there
+HEADLESS = os.environ.get('LIBTCOD_HEADLESS', '') not in ('', '0')
+
+# Everything the game needs without the native library is provided by libtcodpy.headless instead
+if HEADLESS:
+    _lib = _MissingLibrary()
 else:
-    _get_cdll('SDL2.dll')
-    _lib = _get_cdll('libtcod.dll')
-    MSVC=True
-    # On Windows, ctypes doesn't work well with function returning structs,
-    # so we have to user the _wrapper functions instead
-    for function_name in [
-        "TCOD_color_equals",
-        "TCOD_color_add",
-        "TCOD_color_subtract",
-        "TCOD_color_multiply",
-        "TCOD_color_multiply_scalar",
-        "TCOD_color_lerp",
-        "TCOD_color_get_HSV",
-        "TCOD_color_get_hue",
-        "TCOD_color_get_saturation",
-        "TCOD_color_get_value",
-        "TCOD_console_get_default_background",
-        "TCOD_console_get_default_foreground",
-        "TCOD_console_set_default_background",
-        "TCOD_console_set_default_foreground",
-        "TCOD_console_get_char_foreground",
-        "TCOD_console_get_char_background",
-        "TCOD_console_set_char_background",
-        "TCOD_console_set_char_foreground",
-        "TCOD_console_put_char_ex",
-        "TCOD_console_set_fade",
-        "TCOD_console_get_fading_color",
-        "TCOD_console_set_color_control",
-        "TCOD_image_clear",
-        "TCOD_image_get_pixel",
-        "TCOD_image_get_mipmap_pixel",
-        "TCOD_image_put_pixel",
-        "TCOD_image_set_key_color",
-        "TCOD_parser_get_color_property",
-        "TCOD_console_set_key_color",
-    ]:
-        wrapper_func = getattr(_lib, function_name +"_wrapper", None)
-        if wrapper_func is not None:
-            setattr(_lib, function_name, wrapper_func)
+    try:
+        if sys.platform.find('linux') != -1:
+            _lib = _get_cdll('libtcod.so')
+            LINUX=True
+        elif sys.platform.find('darwin') != -1:
+            _lib = _get_cdll('libtcod.dylib')
+            MAC = True
+        elif sys.platform.find('haiku') != -1:
+            _lib = _get_cdll('libtcod.so')
+            HAIKU = True
         else:
-            raise Exception("unable to find wrapper", function_name)
+            _get_cdll('SDL2.dll')
+            _lib = _get_cdll('libtcod.dll')
+            MSVC=True
+            # On Windows, ctypes doesn't work well with function returning structs,
+            # so we have to user the _wrapper functions instead
+            for function_name in [
+                "TCOD_color_equals",
+                "TCOD_color_add",
+                "TCOD_color_subtract",
+                "TCOD_color_multiply",
+                "TCOD_color_multiply_scalar",
+                "TCOD_color_lerp",
+                "TCOD_color_get_HSV",
+                "TCOD_color_get_hue",
+                "TCOD_color_get_saturation",
+                "TCOD_color_get_value",
+                "TCOD_console_get_default_background",
+                "TCOD_console_get_default_foreground",
+                "TCOD_console_set_default_background",
+                "TCOD_console_set_default_foreground",
+                "TCOD_console_get_char_foreground",
+                "TCOD_console_get_char_background",
+                "TCOD_console_set_char_background",
+                "TCOD_console_set_char_foreground",
+                "TCOD_console_put_char_ex",
+                "TCOD_console_set_fade",
+                "TCOD_console_get_fading_color",
+                "TCOD_console_set_color_control",
+                "TCOD_image_clear",
+                "TCOD_image_get_pixel",
+                "TCOD_image_get_mipmap_pixel",
+                "TCOD_image_put_pixel",
+                "TCOD_image_set_key_color",
+                "TCOD_parser_get_color_property",
+                "TCOD_console_set_key_color",
+            ]:
+                wrapper_func = getattr(_lib, function_name +"_wrapper", None)
+                if wrapper_func is not None:
+                    setattr(_lib, function_name, wrapper_func)
+                else:
+                    raise Exception("unable to find wrapper", function_name)
+    except LibraryNotFoundError as e:
+        # Only a missing library falls back. A library that is there but does not load is an error.
+        print("Warning: %s, using the headless libtcod backend, which opens no window" % e, file=sys.stderr)
+        _lib = _MissingLibrary()
+        HEADLESS = True
 
 HEXVERSION = 0x010603
 STRVERSION = "1.6.3"
@@ -2889,3 +2923,7 @@ _lib.TCOD_zip_get_remaining_bytes.argtypes=[c_void_p ]
 
 _lib.TCOD_zip_skip_bytes.restype=c_void
 _lib.TCOD_zip_skip_bytes.argtypes=[c_void_p ,c_int ]
+
+# Without the native library, replace the functions above with the pure Python ones
+if HEADLESS:
+    from .headless import *
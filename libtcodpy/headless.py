@@ -0,0 +1,1041 @@
+"""
+Headless libtcod
+----
+A pure Python and NumPy stand-in for the part of libtcod the game uses. It is picked automatically
+when the native library cannot be loaded, or when LIBTCOD_HEADLESS=1 is set.
+
+Consoles are in-memory arrays and nothing is ever shown on screen. Input comes from a scripted
+event source set with set_event_source. The window counts as closed once that source runs out.
+"""
+import heapq
+import textwrap
+
+import numpy as np
+
+from libtcodpy import (_lib, Color, BKGND_NONE, BKGND_SET, BKGND_MULTIPLY, BKGND_LIGHTEN, BKGND_DARKEN,
+                       BKGND_SCREEN, BKGND_ADD, BKGND_ADDA, BKGND_ALPH, BKGND_DEFAULT, LEFT, RIGHT, CENTER,
+                       EVENT_KEY_PRESS, EVENT_MOUSE_MOVE, EVENT_MOUSE_PRESS, KEY_NONE, KEY_CHAR)
+
+__all__ = [
+    'set_event_source', 'key_event', 'mouse_event', 'get_frame_count',
+    'console_init_root', 'console_set_custom_font', 'console_is_window_closed', 'console_flush',
+    'console_is_fullscreen', 'console_set_fullscreen', 'console_set_window_title',
+    'console_new', 'console_delete', 'console_get_width', 'console_get_height',
+    'console_set_default_background', 'console_set_default_foreground',
+    'console_get_default_background', 'console_get_default_foreground',
+    'console_set_background_flag', 'console_get_background_flag', 'console_set_alignment', 'console_get_alignment',
+    'console_clear', 'console_put_char', 'console_put_char_ex', 'console_set_char', 'console_get_char',
+    'console_set_char_background', 'console_set_char_foreground',
+    'console_get_char_background', 'console_get_char_foreground',
+    'console_print', 'console_print_ex', 'console_print_rect', 'console_print_rect_ex', 'console_get_height_rect',
+    'console_rect', 'console_blit', 'console_fill_background', 'console_fill_foreground', 'console_fill_char',
+    'sys_check_for_event', 'sys_wait_for_event', 'sys_set_fps', 'sys_get_fps',
+    'image_load', 'image_blit_2x',
+    'map_new', 'map_copy', 'map_set_properties', 'map_clear', 'map_compute_fov', 'map_set_in_fov',
+    'map_is_in_fov', 'map_is_transparent', 'map_is_walkable', 'map_delete',
+    'map_get_width', 'map_get_height', 'map_get_nb_cells',
+    'path_new_using_map', 'path_new_using_function', 'path_compute', 'path_get_origin', 'path_get_destination',
+    'path_size', 'path_reverse', 'path_get', 'path_is_empty', 'path_walk', 'path_delete',
+    'dijkstra_new', 'dijkstra_new_using_function', 'dijkstra_compute', 'dijkstra_path_set',
+    'dijkstra_get_distance', 'dijkstra_size', 'dijkstra_reverse', 'dijkstra_get', 'dijkstra_is_empty',
+    'dijkstra_path_walk', 'dijkstra_delete',
+]
+
+
+############################
+# colors
+############################
+
+def _value(v):
+    # Arguments arrive either as plain numbers or wrapped in ctypes, like c_float(0.5)
+    return getattr(v, 'value', v)
+
+
+def _clamp(v):
+    return max(0, min(255, int(v)))
+
+
+def _color_equals(c1, c2):
+    return isinstance(c2, Color) and (c1.r, c1.g, c1.b) == (c2.r, c2.g, c2.b)
+
+
+def _color_add(c1, c2):
+    return Color(_clamp(c1.r + c2.r), _clamp(c1.g + c2.g), _clamp(c1.b + c2.b))
+
+
+def _color_subtract(c1, c2):
+    return Color(_clamp(c1.r - c2.r), _clamp(c1.g - c2.g), _clamp(c1.b - c2.b))
+
+
+def _color_multiply(c1, c2):
+    return Color(c1.r * c2.r // 255, c1.g * c2.g // 255, c1.b * c2.b // 255)
+
+
+def _color_multiply_scalar(c, value):
+    value = _value(value)
+    return Color(_clamp(c.r * value), _clamp(c.g * value), _clamp(c.b * value))
+
+
+def _color_lerp(c1, c2, a):
+    a = _value(a)
+    return Color(_clamp(c1.r + (c2.r - c1.r) * a), _clamp(c1.g + (c2.g - c1.g) * a),
+                 _clamp(c1.b + (c2.b - c1.b) * a))
+
+
+# Color's operators call into the library, so give them Python versions
+_lib.TCOD_color_equals = _color_equals
+_lib.TCOD_color_add = _color_add
+_lib.TCOD_color_subtract = _color_subtract
+_lib.TCOD_color_multiply = _color_multiply
+_lib.TCOD_color_multiply_scalar = _color_multiply_scalar
+_lib.TCOD_color_lerp = _color_lerp
+
+
+############################
+# console
+############################
+
+class HeadlessConsole(object):
+    """
+    An off-screen console. Characters and colors are arrays indexed [y, x], like the fill functions expect.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.default_fg = Color(255, 255, 255)
+        self.default_bg = Color(0, 0, 0)
+        self.bkgnd_flag = BKGND_NONE
+        self.alignment = LEFT
+
+        self.ch = np.empty((height, width), dtype=np.int32)
+        self.fg = np.empty((height, width, 3), dtype=np.int32)
+        self.bg = np.empty((height, width, 3), dtype=np.int32)
+        self.clear()
+
+    def clear(self):
+        self.ch[:] = ord(' ')
+        self.fg[:] = tuple(self.default_fg)
+        self.bg[:] = tuple(self.default_bg)
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+
+class _Window(object):
+    def __init__(self):
+        self.root = None
+        self.closed = False
+        self.fullscreen = False
+        self.frames = 0
+        self.fps = 0
+        self.events = iter(())
+
+
+_window = _Window()
+
+
+def _console(con):
+    # 0 (or None) is the root console, like in libtcod
+    if not con:
+        if _window.root is None:
+            raise RuntimeError('console_init_root has not been called')
+        return _window.root
+
+    return con
+
+
+def _char_code(c):
+    if isinstance(c, int):
+        return c
+
+    return ord(c)
+
+
+def _blend(old, color, flag, console):
+    # Apply a background color to a slice of the bg array using one of libtcod's background flags
+    if flag == BKGND_DEFAULT:
+        flag = console.bkgnd_flag
+
+    mode = flag & 0xff
+    alpha = (flag >> 8) / 255.0
+    new = np.array(tuple(color), dtype=np.int32)
+
+    if mode == BKGND_NONE:
+        return
+    elif mode == BKGND_MULTIPLY:
+        old[:] = old * new // 255
+    elif mode == BKGND_LIGHTEN:
+        old[:] = np.maximum(old, new)
+    elif mode == BKGND_DARKEN:
+        old[:] = np.minimum(old, new)
+    elif mode == BKGND_SCREEN:
+        old[:] = 255 - (255 - old) * (255 - new) // 255
+    elif mode == BKGND_ADD:
+        old[:] = np.minimum(old + new, 255)
+    elif mode == BKGND_ALPH:
+        old[:] = old + ((new - old) * alpha).astype(np.int32)
+    elif mode == BKGND_ADDA:
+        old[:] = np.minimum(old + (new * alpha).astype(np.int32), 255)
+    else:
+        # BKGND_SET, and the blend modes with no use here, just set the color
+        old[:] = new
+
+
+def console_init_root(w, h, title, fullscreen=False, renderer=None):
+    _window.root = HeadlessConsole(w, h)
+    _window.closed = False
+    _window.fullscreen = fullscreen
+
+
+def console_set_custom_font(fontFile, flags=0, nb_char_horiz=0, nb_char_vertic=0):
+    pass
+
+
+def console_is_window_closed():
+    return _window.closed
+
+
+def console_flush():
+    _window.frames += 1
+
+
+def get_frame_count():
+    return _window.frames
+
+
+def console_is_fullscreen():
+    return _window.fullscreen
+
+
+def console_set_fullscreen(fullscreen):
+    _window.fullscreen = fullscreen
+
+
+def console_set_window_title(title):
+    pass
+
+
+def console_new(w, h):
+    return HeadlessConsole(w, h)
+
+
+def console_delete(con):
+    if not con:
+        _window.root = None
+        _window.closed = True
+
+
+def console_get_width(con):
+    return _console(con).width
+
+
+def console_get_height(con):
+    return _console(con).height
+
+
+def console_set_default_background(con, col):
+    _console(con).default_bg = Color(col.r, col.g, col.b)
+
+
+def console_set_default_foreground(con, col):
+    _console(con).default_fg = Color(col.r, col.g, col.b)
+
+
+def console_get_default_background(con):
+    col = _console(con).default_bg
+    return Color(col.r, col.g, col.b)
+
+
+def console_get_default_foreground(con):
+    col = _console(con).default_fg
+    return Color(col.r, col.g, col.b)
+
+
+def console_set_background_flag(con, flag):
+    _console(con).bkgnd_flag = flag
+
+
+def console_get_background_flag(con):
+    return _console(con).bkgnd_flag
+
+
+def console_set_alignment(con, alignment):
+    _console(con).alignment = alignment
+
+
+def console_get_alignment(con):
+    return _console(con).alignment
+
+
+def console_clear(con):
+    _console(con).clear()
+
+
+def console_put_char(con, x, y, c, flag=BKGND_DEFAULT):
+    con = _console(con)
+
+    if con.in_bounds(x, y):
+        con.ch[y, x] = _char_code(c)
+        con.fg[y, x] = tuple(con.default_fg)
+        _blend(con.bg[y, x], con.default_bg, flag, con)
+
+
+def console_put_char_ex(con, x, y, c, fore, back):
+    con = _console(con)
+
+    if con.in_bounds(x, y):
+        con.ch[y, x] = _char_code(c)
+        con.fg[y, x] = tuple(fore)
+        con.bg[y, x] = tuple(back)
+
+
+def console_set_char(con, x, y, c):
+    con = _console(con)
+
+    if con.in_bounds(x, y):
+        con.ch[y, x] = _char_code(c)
+
+
+def console_get_char(con, x, y):
+    return int(_console(con).ch[y, x])
+
+
+def console_set_char_background(con, x, y, col, flag=BKGND_SET):
+    con = _console(con)
+
+    if con.in_bounds(x, y):
+        _blend(con.bg[y, x], col, flag, con)
+
+
+def console_set_char_foreground(con, x, y, col):
+    con = _console(con)
+
+    if con.in_bounds(x, y):
+        con.fg[y, x] = tuple(col)
+
+
+def console_get_char_background(con, x, y):
+    return Color(*_console(con).bg[y, x].tolist())
+
+
+def console_get_char_foreground(con, x, y):
+    return Color(*_console(con).fg[y, x].tolist())
+
+
+def _print_line(con, x, y, flag, alignment, text, min_x=0, max_x=None):
+    if max_x is None:
+        max_x = con.width
+
+    if alignment == RIGHT:
+        x -= len(text) - 1
+    elif alignment == CENTER:
+        x -= len(text) // 2
+
+    # Clip the line to the console and to the rectangle it is printed in, then draw it in one go
+    start = max(x, min_x, 0)
+    end = min(x + len(text), max_x, con.width)
+
+    if not 0 <= y < con.height or start >= end:
+        return
+
+    con.ch[y, start:end] = [ord(c) for c in text[start - x:end - x]]
+    con.fg[y, start:end] = tuple(con.default_fg)
+    _blend(con.bg[y, start:end], con.default_bg, flag, con)
+
+
+def _wrap(text, width):
+    # Split the text into lines that fit the width, keeping the line breaks that are in the text
+    lines = []
+
+    for paragraph in text.split('\n'):
+        lines.extend(textwrap.wrap(paragraph, max(width, 1)) or [''])
+
+    # A line break at the very end does not start another line
+    if lines and lines[-1] == '' and text.endswith('\n'):
+        lines.pop()
+
+    if lines == ['']:
+        return []
+
+    return lines
+
+
+def console_print(con, x, y, fmt):
+    con = _console(con)
+    console_print_ex(con, x, y, con.bkgnd_flag, con.alignment, fmt)
+
+
+def console_print_ex(con, x, y, flag, alignment, fmt):
+    con = _console(con)
+
+    for i, line in enumerate(fmt.split('\n')):
+        _print_line(con, x, y + i, flag, alignment, line)
+
+
+def _rect_lines(con, x, y, w, h, alignment, fmt):
+    if w == 0:
+        w = con.width - x if alignment == LEFT else con.width
+
+    lines = _wrap(fmt, w)
+
+    if h > 0:
+        lines = lines[:h]
+
+    return w, lines
+
+
+def console_print_rect(con, x, y, w, h, fmt):
+    con = _console(con)
+    return console_print_rect_ex(con, x, y, w, h, con.bkgnd_flag, con.alignment, fmt)
+
+
+def console_print_rect_ex(con, x, y, w, h, flag, alignment, fmt):
+    con = _console(con)
+    w, lines = _rect_lines(con, x, y, w, h, alignment, fmt)
+
+    # x is the left edge of the rectangle, its right edge or its middle, depending on the alignment
+    if alignment == LEFT:
+        min_x = x
+    elif alignment == RIGHT:
+        min_x = x - w + 1
+    else:
+        min_x = x - w // 2
+
+    for i, line in enumerate(lines):
+        _print_line(con, x, y + i, flag, alignment, line, min_x, min_x + w)
+
+    return len(lines)
+
+
+def console_get_height_rect(con, x, y, w, h, fmt):
+    con = _console(con)
+    return len(_rect_lines(con, x, y, w, h, LEFT, fmt)[1])
+
+
+def console_rect(con, x, y, w, h, clr, flag=BKGND_DEFAULT):
+    con = _console(con)
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(x + w, con.width), min(y + h, con.height)
+
+    if x1 >= x2 or y1 >= y2:
+        return
+
+    if clr:
+        con.ch[y1:y2, x1:x2] = ord(' ')
+
+    _blend(con.bg[y1:y2, x1:x2], con.default_bg, flag, con)
+
+
+def console_blit(src, x, y, w, h, dst, xdst, ydst, ffade=1.0, bfade=1.0):
+    src = _console(src)
+    dst = _console(dst)
+
+    if w == 0:
+        w = src.width
+    if h == 0:
+        h = src.height
+
+    # Clip the rectangle to both consoles
+    if x < 0:
+        w, xdst, x = w + x, xdst - x, 0
+    if y < 0:
+        h, ydst, y = h + y, ydst - y, 0
+    if xdst < 0:
+        w, x, xdst = w + xdst, x - xdst, 0
+    if ydst < 0:
+        h, y, ydst = h + ydst, y - ydst, 0
+
+    w = min(w, src.width - x, dst.width - xdst)
+    h = min(h, src.height - y, dst.height - ydst)
+
+    if w <= 0 or h <= 0:
+        return
+
+    src_area = (slice(y, y + h), slice(x, x + w))
+    dst_area = (slice(ydst, ydst + h), slice(xdst, xdst + w))
+
+    if ffade == 1.0 and bfade == 1.0:
+        dst.ch[dst_area] = src.ch[src_area]
+        dst.fg[dst_area] = src.fg[src_area]
+        dst.bg[dst_area] = src.bg[src_area]
+        return
+
+    # Faded blit: the background is mixed with what is underneath, the characters are drawn over it
+    old_bg = dst.bg[dst_area]
+    new_bg = old_bg + ((src.bg[src_area] - old_bg) * bfade).astype(np.int32)
+    dst.bg[dst_area] = new_bg
+
+    drawn = src.ch[src_area] != ord(' ')
+    dst.ch[dst_area] = np.where(drawn, src.ch[src_area], dst.ch[dst_area])
+    faded_fg = new_bg + ((src.fg[src_area] - new_bg) * ffade).astype(np.int32)
+    dst.fg[dst_area] = np.where(drawn[..., np.newaxis], faded_fg, dst.fg[dst_area])
+
+
+def _fill(con, channel, values, index=None):
+    values = np.asarray(values, dtype=np.int32).reshape(con.height, con.width)
+
+    if index is None:
+        channel[:] = values
+    else:
+        channel[..., index] = values
+
+
+def console_fill_background(con, r, g, b):
+    if len(r) != len(g) or len(r) != len(b):
+        raise TypeError('R, G and B must all have the same size.')
+
+    con = _console(con)
+    for index, values in enumerate((r, g, b)):
+        _fill(con, con.bg, values, index)
+
+
+def console_fill_foreground(con, r, g, b):
+    if len(r) != len(g) or len(r) != len(b):
+        raise TypeError('R, G and B must all have the same size.')
+
+    con = _console(con)
+    for index, values in enumerate((r, g, b)):
+        _fill(con, con.fg, values, index)
+
+
+def console_fill_char(con, arr):
+    con = _console(con)
+    _fill(con, con.ch, arr)
+
+
+############################
+# input
+############################
+
+def set_event_source(events):
+    """
+    Script the input. events is any iterable, and one item is taken from it every time the game checks
+    for input: a key_event, a mouse_event, or None for a frame without input.
+    The window closes once the iterable runs out, which ends the game loops.
+    """
+    _window.events = iter(events)
+    _window.closed = False
+
+
+def key_event(vk=KEY_NONE, c='', lalt=False, lctrl=False, shift=False):
+    # A typed character with no special key counts as KEY_CHAR, like in libtcod
+    if c and vk == KEY_NONE:
+        vk = KEY_CHAR
+
+    return {'type': 'key', 'vk': vk, 'c': c, 'lalt': lalt, 'lctrl': lctrl, 'shift': shift}
+
+
+def mouse_event(cx, cy, lbutton_pressed=False, rbutton_pressed=False):
+    return {'type': 'mouse', 'cx': cx, 'cy': cy, 'lbutton_pressed': lbutton_pressed,
+            'rbutton_pressed': rbutton_pressed}
+
+
+def sys_check_for_event(mask, k, m):
+    # Forget the last frame's input; the mouse stays where it was
+    k.vk, k.c, k.pressed = KEY_NONE, 0, False
+    k.lalt = k.lctrl = k.shift = False
+    m.lbutton_pressed = m.rbutton_pressed = m.mbutton_pressed = False
+
+    if _window.closed:
+        return 0
+
+    try:
+        event = next(_window.events)
+    except StopIteration:
+        _window.closed = True
+        return 0
+
+    if event is None:
+        return 0
+
+    if event['type'] == 'key' and mask & EVENT_KEY_PRESS:
+        k.vk = event['vk']
+        k.c = _char_code(event['c']) if event['c'] else 0
+        k.pressed = True
+        k.lalt = event['lalt']
+        k.lctrl = event['lctrl']
+        k.shift = event['shift']
+
+        return EVENT_KEY_PRESS
+
+    if event['type'] == 'mouse' and mask & (EVENT_MOUSE_MOVE | EVENT_MOUSE_PRESS):
+        m.dcx, m.dcy = event['cx'] - m.cx, event['cy'] - m.cy
+        m.cx, m.cy = event['cx'], event['cy']
+        m.lbutton_pressed = event['lbutton_pressed']
+        m.rbutton_pressed = event['rbutton_pressed']
+
+        if m.lbutton_pressed or m.rbutton_pressed:
+            return EVENT_MOUSE_PRESS
+
+        return EVENT_MOUSE_MOVE
+
+    return 0
+
+
+def sys_wait_for_event(mask, k, m, flush):
+    return sys_check_for_event(mask, k, m)
+
+
+def sys_set_fps(fps):
+    _window.fps = fps
+
+
+def sys_get_fps():
+    return _window.fps
+
+
+############################
+# image
+############################
+
+class HeadlessImage(object):
+    def __init__(self, filename):
+        self.filename = filename
+
+
+def image_load(filename):
+    return HeadlessImage(filename)
+
+
+def image_blit_2x(image, console, dx, dy, sx=0, sy=0, w=-1, h=-1):
+    pass
+
+
+############################
+# fov
+############################
+
+class HeadlessMap(object):
+    """
+    A FOV / pathfinding map. The arrays are indexed [x, y], like the game's own tile arrays.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.transparent = np.zeros((width, height), dtype=bool)
+        self.walkable = np.zeros((width, height), dtype=bool)
+        self.fov = np.zeros((width, height), dtype=bool)
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+
+# Multipliers that turn the first octant into each of the eight
+_OCTANTS = ((1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+            (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1))
+
+
+def map_new(w, h):
+    return HeadlessMap(w, h)
+
+
+def map_copy(source, dest):
+    dest.width, dest.height = source.width, source.height
+    dest.transparent = source.transparent.copy()
+    dest.walkable = source.walkable.copy()
+    dest.fov = source.fov.copy()
+
+
+def map_set_properties(m, x, y, isTrans, isWalk):
+    m.transparent[x, y] = isTrans
+    m.walkable[x, y] = isWalk
+
+
+def map_clear(m, walkable=False, transparent=False):
+    m.transparent[:] = transparent
+    m.walkable[:] = walkable
+    m.fov[:] = False
+
+
+def map_compute_fov(m, x, y, radius=0, light_walls=True, algo=0):
+    """
+    Recursive shadowcasting, whatever the algorithm asked for, so results can differ a little from libtcod's.
+    A radius of 0 means no limit.
+    """
+    m.fov[:] = False
+
+    if not m.in_bounds(x, y):
+        return
+
+    if radius <= 0:
+        radius = m.width + m.height
+
+    transparent = m.transparent
+    lit = [(x, y)]
+
+    for xx, xy, yx, yy in _OCTANTS:
+        _cast_light(m, transparent, lit, x, y, 1, 1.0, 0.0, radius, xx, xy, yx, yy, light_walls)
+
+    xs, ys = zip(*lit)
+    m.fov[list(xs), list(ys)] = True
+
+
+def _cast_light(m, transparent, lit, cx, cy, row, start, end, radius, xx, xy, yx, yy, light_walls):
+    if start < end:
+        return
+
+    radius_squared = radius * radius
+    new_start = start
+
+    for j in range(row, radius + 1):
+        dx = -j - 1
+        dy = -j
+        blocked = False
+
+        while dx <= 0:
+            dx += 1
+            map_x = cx + dx * xx + dy * xy
+            map_y = cy + dx * yx + dy * yy
+            left_slope = (dx - 0.5) / (dy + 0.5)
+            right_slope = (dx + 0.5) / (dy - 0.5)
+
+            if start < right_slope:
+                continue
+            elif end > left_slope:
+                break
+
+            # Anything off the map blocks sight
+            if m.in_bounds(map_x, map_y):
+                opaque = not transparent.item(map_x, map_y)
+
+                if dx * dx + dy * dy <= radius_squared and (light_walls or not opaque):
+                    lit.append((map_x, map_y))
+            else:
+                opaque = True
+
+            if blocked:
+                if opaque:
+                    new_start = right_slope
+                    continue
+                else:
+                    blocked = False
+                    start = new_start
+            elif opaque and j < radius:
+                # This is a blocking cell, so scan the next row with the part of the view that is still open
+                blocked = True
+                _cast_light(m, transparent, lit, cx, cy, j + 1, start, left_slope, radius, xx, xy, yx, yy,
+                            light_walls)
+                new_start = right_slope
+
+        if blocked:
+            break
+
+
+def map_set_in_fov(m, x, y, fov):
+    m.fov[x, y] = fov
+
+
+def map_is_in_fov(m, x, y):
+    return m.in_bounds(x, y) and m.fov.item(x, y)
+
+
+def map_is_transparent(m, x, y):
+    return m.transparent.item(x, y)
+
+
+def map_is_walkable(m, x, y):
+    return m.walkable.item(x, y)
+
+
+def map_delete(m):
+    pass
+
+
+def map_get_width(m):
+    return m.width
+
+
+def map_get_height(m):
+    return m.height
+
+
+def map_get_nb_cells(m):
+    return m.width * m.height
+
+
+############################
+# pathfinding
+############################
+
+_NEIGHBOURS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+class HeadlessPath(object):
+    """
+    An A* path, or a Dijkstra map, over a HeadlessMap or a cost function.
+    The remaining steps are kept last step first, so walking pops from the end of the list.
+    """
+    def __init__(self, width, height, cost, dcost):
+        self.width = width
+        self.height = height
+        self.cost = cost
+        self.dcost = dcost
+        self.origin = (0, 0)
+        self.destination = (0, 0)
+        self.steps = []
+        self.distances = None
+
+    def step_cost(self, x0, y0, x1, y1):
+        # 0 or less means the step cannot be taken
+        if not (0 <= x1 < self.width and 0 <= y1 < self.height):
+            return 0.0
+
+        cost = self.cost(x0, y0, x1, y1)
+
+        if cost > 0 and x0 != x1 and y0 != y1:
+            if self.dcost <= 0:
+                return 0.0
+
+            cost *= self.dcost
+
+        return cost
+
+
+def _map_cost(m):
+    walkable = m.walkable
+
+    def cost(x0, y0, x1, y1):
+        return 1.0 if walkable.item(x1, y1) else 0.0
+
+    return cost
+
+
+def _function_cost(func, userdata):
+    def cost(x0, y0, x1, y1):
+        return func(x0, y0, x1, y1, userdata)
+
+    return cost
+
+
+def path_new_using_map(m, dcost=1.41):
+    return HeadlessPath(m.width, m.height, _map_cost(m), dcost)
+
+
+def path_new_using_function(w, h, func, userdata=0, dcost=1.41):
+    return HeadlessPath(w, h, _function_cost(func, userdata), dcost)
+
+
+def _astar(p, ox, oy, dx, dy):
+    # Returns the steps from the origin to the destination, last step first, or None if there is no path
+    width = p.width
+    diagonal = min(p.dcost, 2.0) if p.dcost > 0 else 2.0
+
+    def heuristic(x, y):
+        ax, ay = abs(dx - x), abs(dy - y)
+        return abs(ax - ay) + diagonal * min(ax, ay)
+
+    start = ox + oy * width
+    goal = dx + dy * width
+    came_from = {start: None}
+    best = {start: 0.0}
+    frontier = [(heuristic(ox, oy), 0.0, start)]
+
+    while frontier:
+        _, cost, current = heapq.heappop(frontier)
+
+        if current == goal:
+            steps = []
+            while current != start:
+                steps.append((current % width, current // width))
+                current = came_from[current]
+            return steps
+
+        if cost > best[current]:
+            continue
+
+        x, y = current % width, current // width
+        for ndx, ndy in _NEIGHBOURS:
+            nx, ny = x + ndx, y + ndy
+            step = p.step_cost(x, y, nx, ny)
+
+            if step <= 0:
+                continue
+
+            index = nx + ny * width
+            new_cost = cost + step
+
+            if new_cost < best.get(index, float('inf')):
+                best[index] = new_cost
+                came_from[index] = current
+                heapq.heappush(frontier, (new_cost + heuristic(nx, ny), new_cost, index))
+
+    return None
+
+
+def path_compute(p, ox, oy, dx, dy):
+    p.origin = (ox, oy)
+    p.destination = (dx, dy)
+    p.steps = []
+
+    if (ox, oy) == (dx, dy):
+        return True
+
+    # Like libtcod, there is no path to a cell that cannot be walked on
+    if not (0 <= dx < p.width and 0 <= dy < p.height) or p.cost(dx, dy, dx, dy) <= 0:
+        return False
+
+    steps = _astar(p, ox, oy, dx, dy)
+
+    if steps is None:
+        return False
+
+    p.steps = steps
+    return True
+
+
+def path_get_origin(p):
+    return p.origin
+
+
+def path_get_destination(p):
+    return p.destination
+
+
+def path_size(p):
+    return len(p.steps)
+
+
+def path_reverse(p):
+    cells = [p.origin] + p.steps[::-1]
+    p.origin, p.destination = p.destination, p.origin
+    p.steps = cells[:-1]
+
+
+def path_get(p, idx):
+    return p.steps[-1 - idx]
+
+
+def path_is_empty(p):
+    return not p.steps
+
+
+def path_walk(p, recompute):
+    if not p.steps:
+        return None, None
+
+    x, y = p.steps[-1]
+
+    # Something is in the way now, look for another way to the destination
+    if p.step_cost(p.origin[0], p.origin[1], x, y) <= 0:
+        if not recompute or not path_compute(p, p.origin[0], p.origin[1], p.destination[0], p.destination[1]):
+            return None, None
+
+        if not p.steps:
+            return None, None
+
+        x, y = p.steps[-1]
+
+    p.steps.pop()
+    p.origin = (x, y)
+    return x, y
+
+
+def path_delete(p):
+    pass
+
+
+def dijkstra_new(m, dcost=1.41):
+    return HeadlessPath(m.width, m.height, _map_cost(m), dcost)
+
+
+def dijkstra_new_using_function(w, h, func, userdata=0, dcost=1.41):
+    return HeadlessPath(w, h, _function_cost(func, userdata), dcost)
+
+
+def dijkstra_compute(p, ox, oy):
+    width = p.width
+    distances = [-1.0] * (p.width * p.height)
+    start = ox + oy * width
+    distances[start] = 0.0
+    frontier = [(0.0, start)]
+
+    while frontier:
+        cost, current = heapq.heappop(frontier)
+
+        if cost > distances[current]:
+            continue
+
+        x, y = current % width, current // width
+        for ndx, ndy in _NEIGHBOURS:
+            nx, ny = x + ndx, y + ndy
+            step = p.step_cost(x, y, nx, ny)
+
+            if step <= 0:
+                continue
+
+            index = nx + ny * width
+            new_cost = cost + step
+            old_cost = distances[index]
+
+            if old_cost < 0 or new_cost < old_cost:
+                distances[index] = new_cost
+                heapq.heappush(frontier, (new_cost, index))
+
+    p.origin = (ox, oy)
+    p.distances = distances
+    p.steps = []
+
+
+def dijkstra_get_distance(p, x, y):
+    if not (0 <= x < p.width and 0 <= y < p.height) or p.distances is None:
+        return -1.0
+
+    return p.distances[x + y * p.width]
+
+
+def dijkstra_path_set(p, x, y):
+    # Walk downhill from (x, y) to the root of the map
+    p.steps = []
+
+    if dijkstra_get_distance(p, x, y) < 0:
+        return False
+
+    path = []
+    distance = dijkstra_get_distance(p, x, y)
+
+    while distance > 0:
+        best = None
+
+        for ndx, ndy in _NEIGHBOURS:
+            nx, ny = x + ndx, y + ndy
+            next_distance = dijkstra_get_distance(p, nx, ny)
+
+            if 0 <= next_distance < distance:
+                best, distance = (nx, ny), next_distance
+
+        if best is None:
+            break
+
+        x, y = best
+        path.append(best)
+
+    p.destination = p.origin
+    p.steps = path[::-1]
+    return True
+
+
+def dijkstra_size(p):
+    return len(p.steps)
+
+
+def dijkstra_reverse(p):
+    p.steps.reverse()
+
+
+def dijkstra_get(p, idx):
+    return p.steps[-1 - idx]
+
+
+def dijkstra_is_empty(p):
+    return not p.steps
+
+
+def dijkstra_path_walk(p):
+    if not p.steps:
+        return None, None
+
+    return p.steps.pop()
+
+
+def dijkstra_delete(p):
+    pass
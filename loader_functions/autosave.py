@@ -0,0 +1,93 @@
+"""
+Autosave
+----
+Saves the game every few turns and on every new floor, without holding up the main loop.
+A snapshot of the game is taken on the main thread, which is quick, and a worker thread
+compresses it and writes it to disk.
+"""
+import threading
+
+from loader_functions.data_loaders import write_save_file
+from loader_functions.save_format import encode_snapshot, snapshot_save
+
+
+class Autosaver:
+    def __init__(self, interval):
+        # interval is the number of turns between saves, 0 turns autosaving off
+        self.interval = interval
+        self.turns = 0
+        self.pending = None
+        self.writing = False
+        self.stopped = False
+        self.error = None
+        self.condition = threading.Condition()
+        self.thread = None
+
+        if self.interval:
+            self.thread = threading.Thread(target=self.run, name='autosave')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def turn_taken(self, player, entities, game_map, message_log, game_state):
+        self.turns += 1
+
+        if self.interval and self.turns >= self.interval:
+            self.save(player, entities, game_map, message_log, game_state)
+
+    def save(self, player, entities, game_map, message_log, game_state):
+        if not self.thread:
+            return
+
+        # The snapshot is taken here, between turns, so the game cannot change halfway through it
+        snapshot = snapshot_save(player, entities, game_map, message_log, game_state)
+        self.turns = 0
+
+        with self.condition:
+            # A snapshot still waiting to be written is out of date now, so it is simply replaced
+            self.pending = snapshot
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopped:
+                    self.condition.wait()
+
+                if self.pending is None:
+                    return
+
+                snapshot = self.pending
+                self.pending = None
+                self.writing = True
+
+            try:
+                write_save_file(encode_snapshot(snapshot))
+            except Exception as e:
+                # Whatever went wrong, the thread keeps going and the next autosave tries again.
+                # The main loop tells the player.
+                with self.condition:
+                    self.error = e
+
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+    def take_error(self):
+        # The error of the last failed write, if there was one since the last call
+        with self.condition:
+            error = self.error
+            self.error = None
+
+        return error
+
+    def stop(self):
+        # Write what is still waiting and end the thread
+        if not self.thread:
+            return
+
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+        self.thread.join()
+        self.thread = None
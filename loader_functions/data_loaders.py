@@ -1,28 +1,124 @@
 import os
 import contextlib
+import functools
+import io
+import pickle
+import sys
+import threading
 
 import shelve
 
+from loader_functions.save_format import decode_save, encode_save
+from slotted import Slotted
+
+SAVE_FILE = 'savegame.sav'
+
+# A save game is written here first, then renamed to SAVE_FILE
+TEMPORARY_SAVE_FILE = SAVE_FILE + '.tmp'
+
+# Save games from before the binary format were written with shelve
+SHELVE_SAVE = 'savegame'
+
+# The autosave thread and the main thread both write the save file
+save_file_lock = threading.Lock()
+
+
 def save_game(player, entities, game_map, message_log, game_state):
-    with contextlib.closing(shelve.open('savegame', 'n')) as data_file:
-        data_file['player_index'] = entities.index(player)
-        data_file['entities'] = entities
-        data_file['game_map'] = game_map
-        data_file['message_log'] = message_log
-        data_file['game_state'] = game_state
+    write_save_file(encode_save(player, entities, game_map, message_log, game_state))
+
+
+def write_save_file(data):
+    # Write to a temporary file first, so a crash while saving never leaves half a save game behind
+    with save_file_lock:
+        with open(TEMPORARY_SAVE_FILE, 'wb') as save_file:
+            save_file.write(data)
+            save_file.flush()
+            os.fsync(save_file.fileno())
+
+        # The rename replaces the old save game in one step, except on Windows, where it cannot replace a file.
+        # A crash between the two steps there leaves only the new save game, which recover_save_file picks up.
+        if sys.platform == 'win32' and os.path.isfile(SAVE_FILE):
+            os.remove(SAVE_FILE)
+
+        os.rename(TEMPORARY_SAVE_FILE, SAVE_FILE)
+
+
+def recover_save_file():
+    # A finished save game that did not get renamed before a crash
+    if not os.path.isfile(SAVE_FILE) and os.path.isfile(TEMPORARY_SAVE_FILE):
+        with save_file_lock:
+            os.rename(TEMPORARY_SAVE_FILE, SAVE_FILE)
+
+
+def shelve_save_exists():
+    # Depending on the dbm module behind shelve, the save game is a single file or several with extensions
+    return any(os.path.isfile(SHELVE_SAVE + extension) for extension in ('', '.db', '.dat'))
+
+
+def save_game_exists():
+    return os.path.isfile(SAVE_FILE) or os.path.isfile(TEMPORARY_SAVE_FILE) or shelve_save_exists()
 
 
 def load_game():
-    if not os.path.isfile('savegame'):
+    recover_save_file()
+
+    if os.path.isfile(SAVE_FILE):
+        with open(SAVE_FILE, 'rb') as save_file:
+            player, entities, game_map, message_log, game_state = decode_save(save_file.read())
+    elif shelve_save_exists():
+        player, entities, game_map, message_log, game_state = convert_shelve_save()
+    else:
         raise ValueError("File Not Found")
 
-    with contextlib.closing(shelve.open('savegame', 'r')) as data_file:
-        player_index = data_file['player_index']
-        entities = data_file['entities']
-        game_map = data_file['game_map']
-        message_log = data_file['message_log']
-        game_state = data_file['game_state']
+    # The map's position index is not saved, so fill it again from the loaded entities
+    game_map.index_entities(entities)
+
+    # Nor are the fighters' stats with the equipment bonuses added in, so work those out for the loaded equipment
+    for entity in entities:
+        if entity.fighter:
+            entity.fighter.update_stats()
+
+    return player, entities, game_map, message_log, game_state
+
+
+class LegacyUnpickler(pickle.Unpickler):
+    """
+    Reads the pickles in old shelve save games. Those were written before the game's classes had __slots__,
+    when pickle recreated their instances by calling the class, so here the slotted ones are created
+    without running __init__ and then filled in by their __setstate__.
+    """
+    def find_class(self, module, name):
+        cls = pickle.Unpickler.find_class(self, module, name)
+
+        if isinstance(cls, type) and issubclass(cls, Slotted):
+            return functools.partial(object.__new__, cls)
+
+        return cls
+
+
+def read_shelve_value(data_file, key):
+    if sys.version_info[0] >= 3:
+        key = key.encode(data_file.keyencoding)
+
+    return LegacyUnpickler(io.BytesIO(data_file.dict[key])).load()
+
+
+def load_shelve_save():
+    with contextlib.closing(shelve.open(SHELVE_SAVE, 'r')) as data_file:
+        player_index = read_shelve_value(data_file, 'player_index')
+        entities = read_shelve_value(data_file, 'entities')
+        game_map = read_shelve_value(data_file, 'game_map')
+        message_log = read_shelve_value(data_file, 'message_log')
+        game_state = read_shelve_value(data_file, 'game_state')
 
     player = entities[player_index]
 
     return player, entities, game_map, message_log, game_state
+
+
+def convert_shelve_save():
+    # Load an old shelve save game and write it again in the binary format, which is used from then on
+    player, entities, game_map, message_log, game_state = load_shelve_save()
+    save_game(player, entities, game_map, message_log, game_state)
+
+    return player, entities, game_map, message_log, game_state
@@ -0,0 +1,120 @@
+"""
+Entity Templates
+----
+The monsters and items the dungeon is filled with are described in data/entity_templates.json.
+Each template is compiled once into a factory that builds the entity at a position, with everything
+the entities of a kind share, like their color and targeting message, worked out up front.
+Adding a monster or an item means adding a template, with the chances of it spawning by dungeon level.
+"""
+import json
+import os
+import sys
+
+import item_functions
+import libtcodpy as libtcod
+from components.ai import BasicMonster
+from components.equippable import Equippable
+from components.fighter import Fighter
+from components.item import Item
+from entity import Entity
+from equipment_slots import EquipmentSlots
+from game_messages import Message
+from render_functions import RenderOrder
+
+TEMPLATES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data',
+                              'entity_templates.json')
+
+# The AIs a template can name
+AI_CLASSES = {
+    'BasicMonster': BasicMonster
+}
+
+
+def native_strings(value):
+    # The json module reads text as unicode on Python 2, the game uses plain str on both Python 2 and 3
+    if sys.version_info[0] >= 3:
+        return value
+
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    elif isinstance(value, list):
+        return [native_strings(v) for v in value]
+    elif isinstance(value, dict):
+        return dict((native_strings(k), native_strings(v)) for k, v in value.items())
+
+    return value
+
+
+def compile_template(template):
+    # Everything that does not change from one entity of the kind to the next is looked up here, once
+    char = template['char']
+    color = getattr(libtcod, template['color'])
+    name = template['name']
+    blocks = template.get('blocks', False)
+    render_order = getattr(RenderOrder, template['render_order']) if 'render_order' in template else \
+        RenderOrder.CORPSE
+
+    fighter = template.get('fighter')
+    ai_class = AI_CLASSES[template['ai']] if 'ai' in template else None
+
+    use_function = targeting = targeting_message = slot = None
+
+    item = template.get('item')
+    if item:
+        item = dict(item)
+        use_function = getattr(item_functions, item.pop('use_function'))
+        targeting = item.pop('targeting', False)
+        targeting_message = item.pop('targeting_message', None)
+
+        # Every item of the kind shows the same targeting message, which is never changed
+        if targeting_message:
+            targeting_message = Message(targeting_message['text'], getattr(libtcod, targeting_message['color']))
+
+    equippable = template.get('equippable')
+    if equippable:
+        equippable = dict(equippable)
+        slot = getattr(EquipmentSlots, equippable.pop('slot'))
+
+    def create(x, y):
+        return Entity(x, y, char, color, name, blocks, render_order,
+                      fighter=Fighter(**fighter) if fighter else None,
+                      ai=ai_class() if ai_class else None,
+                      item=Item(use_function, targeting, targeting_message, **item) if item is not None else None,
+                      equippable=Equippable(slot, **equippable) if equippable is not None else None)
+
+    return create
+
+
+class EntityTemplates:
+    """
+    The compiled templates: a factory for each kind of monster and item, by id, and the tables of how
+    likely each is to spawn and how many a room can get, by dungeon level, for from_dungeon_level.
+    """
+    def __init__(self, data):
+        self.max_monsters_per_room = data['max_monsters_per_room']
+        self.max_items_per_room = data['max_items_per_room']
+
+        # Lists of (id, chance table), in the order of the file
+        self.monster_chances = [(template['id'], template['chance']) for template in data['monsters']]
+        self.item_chances = [(template['id'], template['chance']) for template in data['items']]
+
+        self.monster_factories = dict((template['id'], compile_template(template)) for template in data['monsters'])
+        self.item_factories = dict((template['id'], compile_template(template)) for template in data['items'])
+
+
+def load_entity_templates(path=TEMPLATES_FILE):
+    with open(path) as templates_file:
+        return EntityTemplates(native_strings(json.load(templates_file)))
+
+
+# Loaded the first time a floor is filled
+entity_templates = None
+
+
+def get_entity_templates():
+    global entity_templates
+
+    if entity_templates is None:
+        entity_templates = load_entity_templates()
+
+    return entity_templates
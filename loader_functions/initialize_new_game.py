@@ -15,6 +15,8 @@ from game_states import GameStates
 
 from map_objects.game_map import GameMap
 
+from random_utils import RandomStreams, floor_streams
+
 from render_functions import RenderOrder
 
 def get_constants():
@@ -39,10 +41,32 @@ def get_constants():
     room_min_size = 6
     max_rooms = 30
 
-    fov_algorithm = 0
     fov_light_walls = True
     fov_radius = 10
 
+    # How many past field of view results are kept per floor, 0 turns the cache off
+    fov_cache_size = 256
+
+    # Monsters follow one shared distance map to the player instead of each running A*
+    chase_field = False
+
+    # Monsters work out what they can see themselves, instead of going by what the player sees
+    monster_sight = False
+
+    # Monsters further than this from the player sleep and cost nothing, 0 keeps everyone awake.
+    # Monsters only act when they are in view, so it should be at least fov_radius.
+    activity_radius = 15
+
+    # The game is saved in the background this often, in turns, and on every new floor. 0 turns it off.
+    autosave_interval = 20
+
+    # Build the next floor on a worker thread while the current one is explored
+    pregenerate_floors = True
+
+    # Every random number in a game comes from this seed, so the same seed plays out the same game.
+    # None picks a new one for every game.
+    seed = None
+
     colors = {
         'dark_wall': libtcod.Color(10, 10, 5),
         'dark_ground': libtcod.Color(10, 30, 10),
@@ -65,9 +89,15 @@ def get_constants():
         'room_max_size': room_max_size,
         'room_min_size': room_min_size,
         'max_rooms': max_rooms,
-        'fov_algorithm': fov_algorithm,
         'fov_light_walls': fov_light_walls,
         'fov_radius': fov_radius,
+        'fov_cache_size': fov_cache_size,
+        'chase_field': chase_field,
+        'monster_sight': monster_sight,
+        'activity_radius': activity_radius,
+        'autosave_interval': autosave_interval,
+        'pregenerate_floors': pregenerate_floors,
+        'seed': seed,
 
         'colors': colors
     }
@@ -92,9 +122,10 @@ def get_game_variables(constants):
     player.inventory.add_item(dagger)
     player.equipment.toggle_equip(dagger)
 
-    game_map = GameMap(constants['map_width'], constants['map_height'])
+    game_map = GameMap(constants['map_width'], constants['map_height'], rng=RandomStreams(constants['seed']))
     game_map.make_map(constants['max_rooms'], constants['room_min_size'], constants['room_max_size'],
-                      constants['map_width'], constants['map_height'], player, entities)
+                      constants['map_width'], constants['map_height'], player, entities,
+                      *floor_streams(game_map.rng.seed, game_map.dungeon_level))
 
     message_log = MessageLog(constants['message_x'], constants['message_width'], constants['message_height'])
 
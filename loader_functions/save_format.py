@@ -0,0 +1,469 @@
+"""
+Save Format
+----
+A compact, versioned binary format for save games, in place of pickling the whole object graph.
+The file starts with a magic string and a format version, followed by a zlib-compressed body:
+the game state, the map's tiles as packed bitplanes, the game's random number streams, the message log,
+and every entity as a typed record.
+Entities refer to each other (inventories, equipment) by their index in the entity table.
+"""
+import numbers
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+import item_functions
+import libtcodpy as libtcod
+from components.ai import BasicMonster, ConfusedMonster
+from components.equipment import Equipment
+from components.equippable import Equippable
+from components.fighter import Fighter
+from components.inventory import Inventory
+from components.item import Item
+from components.level import Level
+from components.stairs import Stairs
+from entity import Entity
+from game_messages import Message, MessageLog
+from map_objects.game_map import GameMap
+from random_utils import GAME_STREAMS, RandomStreams
+
+
+MAGIC = b'RLSAVE'
+VERSION = 3
+
+# Older versions that can still be read. Version 1 has no random number streams,
+# versions 1 and 2 store equipment as a main hand and an off hand instead of a list of slots.
+READABLE_VERSIONS = (1, 2, 3)
+
+# Which components an entity record holds, one bit each
+FIGHTER = 1
+AI = 2
+ITEM = 4
+INVENTORY = 8
+STAIRS = 16
+LEVEL = 32
+EQUIPMENT = 64
+EQUIPPABLE = 128
+
+# Kinds of AI
+NO_AI = 0
+BASIC_MONSTER = 1
+CONFUSED_MONSTER = 2
+
+NO_ENTITY = -1
+
+
+class SaveFormatError(ValueError):
+    pass
+
+
+def _native_str(text):
+    # Names and messages are plain str on both Python 2 and 3
+    if sys.version_info[0] < 3:
+        return text.encode('utf-8')
+
+    return text
+
+
+class SaveWriter:
+    def __init__(self):
+        self.chunks = []
+
+    def pack(self, fmt, *values):
+        self.chunks.append(struct.pack('<' + fmt, *values))
+
+    def bool(self, value):
+        self.pack('?', bool(value))
+
+    def int(self, value):
+        self.pack('i', value)
+
+    def string(self, text):
+        if not isinstance(text, bytes):
+            text = text.encode('utf-8')
+
+        self.pack('I', len(text))
+        self.chunks.append(text)
+
+    def color(self, color):
+        self.pack('BBB', color.r, color.g, color.b)
+
+    def value(self, value):
+        # A value of a few simple types, tagged with its type
+        if value is None:
+            self.pack('c', b'n')
+        elif isinstance(value, bool):
+            self.pack('c?', b'b', value)
+        elif isinstance(value, numbers.Integral):
+            self.pack('cq', b'i', value)
+        elif isinstance(value, numbers.Real):
+            self.pack('cd', b'f', value)
+        else:
+            self.pack('c', b's')
+            self.string(value)
+
+    def bitplane(self, array):
+        self.chunks.append(np.packbits(array.ravel()).tobytes())
+
+    def random_state(self, state):
+        # The state of a random.Random, as returned by its getstate
+        version, internal_state, gauss_next = state
+        self.pack('B{0}I'.format(len(internal_state)), version, *internal_state)
+        self.value(gauss_next)
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+
+class SaveReader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt):
+        fmt = '<' + fmt
+        size = struct.calcsize(fmt)
+
+        if self.offset + size > len(self.data):
+            raise SaveFormatError('The save game is truncated')
+
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += size
+
+        return values
+
+    def bool(self):
+        return self.unpack('?')[0]
+
+    def int(self):
+        return self.unpack('i')[0]
+
+    def string(self):
+        size = self.unpack('I')[0]
+        text = self.data[self.offset:self.offset + size]
+        self.offset += size
+
+        return _native_str(text.decode('utf-8'))
+
+    def color(self):
+        return libtcod.Color(*self.unpack('BBB'))
+
+    def value(self):
+        tag = self.unpack('c')[0]
+
+        if tag == b'n':
+            return None
+        elif tag == b'b':
+            return self.unpack('?')[0]
+        elif tag == b'i':
+            return int(self.unpack('q')[0])
+        elif tag == b'f':
+            return self.unpack('d')[0]
+        elif tag == b's':
+            return self.string()
+
+        raise SaveFormatError('Unknown value type in the save game')
+
+    def bitplane(self, width, height):
+        size = (width * height + 7) // 8
+        packed = np.frombuffer(self.data[self.offset:self.offset + size], dtype=np.uint8)
+        self.offset += size
+
+        return np.unpackbits(packed)[:width * height].reshape(width, height).astype(bool)
+
+    def random_state(self):
+        values = self.unpack('B625I')
+
+        return values[0], values[1:], self.value()
+
+
+def collect_entities(entities):
+    # Everything that has to be saved: the entities on the floor, and the items carried or equipped by them
+    collected = []
+    seen = set()
+    pending = list(entities)
+
+    while pending:
+        entity = pending.pop(0)
+
+        if entity is None or id(entity) in seen:
+            continue
+
+        seen.add(id(entity))
+        collected.append(entity)
+
+        if entity.inventory:
+            pending.extend(entity.inventory.items)
+
+        if entity.equipment:
+            pending.extend(entity.equipment.slots.values())
+
+    return collected
+
+
+def encode_save(player, entities, game_map, message_log, game_state):
+    return encode_snapshot(snapshot_save(player, entities, game_map, message_log, game_state))
+
+
+def snapshot_save(player, entities, game_map, message_log, game_state):
+    """
+    The uncompressed body of a save game. As a bytes object it cannot change after it is taken,
+    so it can be compressed and written out on another thread while the game goes on.
+    """
+    all_entities = collect_entities(entities)
+    ids = dict((id(entity), i) for i, entity in enumerate(all_entities))
+
+    def entity_id(entity):
+        return NO_ENTITY if entity is None else ids[id(entity)]
+
+    writer = SaveWriter()
+    writer.pack('B', game_state)
+
+    # The map, with one bitplane per tile property
+    writer.pack('HHH', game_map.width, game_map.height, game_map.dungeon_level)
+    writer.bitplane(game_map.tiles.blocked)
+    writer.bitplane(game_map.tiles.block_sight)
+    writer.bitplane(game_map.tiles.explored)
+
+    writer.pack('Q', game_map.rng.seed)
+    for state in game_map.rng.getstate():
+        writer.random_state(state)
+
+    writer.pack('HHHI', message_log.x, message_log.width, message_log.height, len(message_log.messages))
+    for message in message_log.messages:
+        writer.string(message.text)
+        writer.color(message.color)
+
+    writer.pack('I', len(all_entities))
+    for entity in all_entities:
+        write_entity(writer, entity, entity_id)
+
+    writer.pack('I', len(entities))
+    for entity in entities:
+        writer.int(entity_id(entity))
+    writer.int(entity_id(player))
+
+    return writer.getvalue()
+
+
+def encode_snapshot(snapshot):
+    return MAGIC + struct.pack('<H', VERSION) + zlib.compress(snapshot)
+
+
+def write_entity(writer, entity, entity_id):
+    components = 0
+    for flag, component in ((FIGHTER, entity.fighter), (AI, entity.ai), (ITEM, entity.item),
+                            (INVENTORY, entity.inventory), (STAIRS, entity.stairs), (LEVEL, entity.level),
+                            (EQUIPMENT, entity.equipment), (EQUIPPABLE, entity.equippable)):
+        if component:
+            components |= flag
+
+    writer.pack('hh', entity.x, entity.y)
+    writer.string(entity.char)
+    writer.color(entity.color)
+    writer.string(entity.name)
+    writer.pack('?BHB', entity.blocks, entity.render_order, entity.speed, components)
+
+    if entity.fighter:
+        fighter = entity.fighter
+        writer.pack('iiiii', fighter.base_max_hp, fighter.hp, fighter.base_defense, fighter.base_power, fighter.xp)
+
+    if entity.ai:
+        write_ai(writer, entity.ai)
+
+    if entity.item:
+        item = entity.item
+        writer.string(item.use_function.__name__ if item.use_function else '')
+        writer.bool(item.targeting)
+        writer.bool(item.targeting_message)
+
+        if item.targeting_message:
+            writer.string(item.targeting_message.text)
+            writer.color(item.targeting_message.color)
+
+        writer.pack('H', len(item.use_function_kwargs))
+        for key in sorted(item.use_function_kwargs):
+            writer.string(key)
+            writer.value(item.use_function_kwargs[key])
+
+    if entity.inventory:
+        writer.pack('HH', entity.inventory.capacity, len(entity.inventory.items))
+        for item_entity in entity.inventory.items:
+            writer.int(entity_id(item_entity))
+
+    if entity.stairs:
+        writer.pack('H', entity.stairs.floor)
+
+    if entity.level:
+        level = entity.level
+        writer.pack('iiii', level.current_level, level.current_xp, level.level_up_base, level.level_up_factor)
+
+    if entity.equipment:
+        slots = entity.equipment.slots
+
+        writer.pack('B', len(slots))
+        for slot in sorted(slots):
+            writer.pack('Bi', slot, entity_id(slots[slot]))
+
+    if entity.equippable:
+        equippable = entity.equippable
+        writer.pack('Biii', equippable.slot, equippable.power_bonus, equippable.defense_bonus,
+                    equippable.max_hp_bonus)
+
+
+def write_ai(writer, ai):
+    if isinstance(ai, ConfusedMonster):
+        writer.pack('BH', CONFUSED_MONSTER, max(ai.number_of_turns, 0))
+        write_ai(writer, ai.previous_ai)
+    elif isinstance(ai, BasicMonster):
+        writer.pack('B', BASIC_MONSTER)
+    else:
+        writer.pack('B', NO_AI)
+
+
+def decode_save(data):
+    if data[:len(MAGIC)] != MAGIC:
+        raise SaveFormatError('Not a save game')
+
+    version = struct.unpack_from('<H', data, len(MAGIC))[0]
+
+    if version not in READABLE_VERSIONS:
+        raise SaveFormatError('Unsupported save game version {0}'.format(version))
+
+    try:
+        reader = SaveReader(zlib.decompress(data[len(MAGIC) + 2:]))
+    except zlib.error:
+        raise SaveFormatError('The save game is corrupted')
+
+    game_state = reader.unpack('B')[0]
+
+    width, height, dungeon_level = reader.unpack('HHH')
+    game_map = GameMap(width, height, dungeon_level)
+    game_map.tiles.blocked[:] = reader.bitplane(width, height)
+    game_map.tiles.block_sight[:] = reader.bitplane(width, height)
+    game_map.tiles.explored[:] = reader.bitplane(width, height)
+
+    if version >= 2:
+        game_map.rng = RandomStreams(reader.unpack('Q')[0])
+        game_map.rng.setstate([reader.random_state() for name in GAME_STREAMS])
+
+    x, log_width, log_height, message_count = reader.unpack('HHHI')
+    message_log = MessageLog(x, log_width, log_height)
+    for i in range(message_count):
+        text = reader.string()
+        message_log.messages.append(Message(text, reader.color()))
+
+    # Read every entity first, then link up the ones that refer to others
+    links = []
+    all_entities = [read_entity(reader, links, version) for i in range(reader.unpack('I')[0])]
+
+    def get_entity(i):
+        if i == NO_ENTITY:
+            return None
+
+        # A negative id would still index the list, so both ends are checked
+        if not 0 <= i < len(all_entities):
+            raise SaveFormatError('The save game refers to entity {0}, which it does not have'.format(i))
+
+        return all_entities[i]
+
+    for link in links:
+        link(get_entity)
+
+    entities = [get_entity(reader.int()) for i in range(reader.unpack('I')[0])]
+    player = get_entity(reader.int())
+
+    return player, entities, game_map, message_log, game_state
+
+
+def read_entity(reader, links, version):
+    x, y = reader.unpack('hh')
+    char = reader.string()
+    color = reader.color()
+    name = reader.string()
+    blocks, render_order, speed, components = reader.unpack('?BHB')
+
+    fighter = ai = item = inventory = stairs = level = equipment = equippable = None
+
+    if components & FIGHTER:
+        base_max_hp, hp, base_defense, base_power, xp = reader.unpack('iiiii')
+        fighter = Fighter(base_max_hp, base_defense, base_power, xp)
+        fighter.hp = hp
+
+    if components & AI:
+        ai = read_ai(reader)
+
+    if components & ITEM:
+        use_function_name = reader.string()
+        targeting = reader.bool()
+        targeting_message = None
+
+        if reader.bool():
+            text = reader.string()
+            targeting_message = Message(text, reader.color())
+
+        kwargs = {}
+        for i in range(reader.unpack('H')[0]):
+            key = reader.string()
+            kwargs[key] = reader.value()
+
+        use_function = getattr(item_functions, use_function_name) if use_function_name else None
+        item = Item(use_function, targeting, targeting_message, **kwargs)
+
+    if components & INVENTORY:
+        capacity, item_count = reader.unpack('HH')
+        inventory = Inventory(capacity)
+        item_ids = [reader.int() for i in range(item_count)]
+        links.append(lambda get_entity: inventory.items.extend(get_entity(i) for i in item_ids))
+
+    if components & STAIRS:
+        stairs = Stairs(reader.unpack('H')[0])
+
+    if components & LEVEL:
+        level = Level(*reader.unpack('iiii'))
+
+    if components & EQUIPMENT:
+        if version >= 3:
+            equipped_ids = [reader.unpack('Bi')[1] for i in range(reader.unpack('B')[0])]
+        else:
+            equipped_ids = reader.unpack('ii')
+
+        equipment = Equipment()
+
+        def link_equipment(get_entity):
+            for item_id in equipped_ids:
+                if item_id != NO_ENTITY:
+                    equipment.equip(get_entity(item_id))
+
+        links.append(link_equipment)
+
+    if components & EQUIPPABLE:
+        slot, power_bonus, defense_bonus, max_hp_bonus = reader.unpack('Biii')
+        equippable = Equippable(slot, power_bonus, defense_bonus, max_hp_bonus)
+
+    entity = Entity(x, y, char, color, name, blocks, render_order, fighter, ai, item, inventory, stairs, level,
+                    equipment, equippable, speed)
+
+    # A confused monster gets its old AI back later, which has to know whose it is too
+    while isinstance(ai, ConfusedMonster):
+        ai = ai.previous_ai
+
+        if ai:
+            ai.owner = entity
+
+    return entity
+
+
+def read_ai(reader):
+    kind = reader.unpack('B')[0]
+
+    if kind == CONFUSED_MONSTER:
+        number_of_turns = reader.unpack('H')[0]
+
+        return ConfusedMonster(read_ai(reader), number_of_turns)
+    elif kind == BASIC_MONSTER:
+        return BasicMonster()
+
+    return None
@@ -0,0 +1,75 @@
+COMPONENTS = ('fighter', 'ai', 'item', 'inventory', 'stairs', 'level', 'equipment', 'equippable')
+
+# One bit per component
+COMPONENT_BITS = dict((name, 1 << i) for i, name in enumerate(COMPONENTS))
+
+
+def get_archetype(entity):
+    archetype = 0
+
+    for name, bit in COMPONENT_BITS.items():
+        if getattr(entity, name) is not None:
+            archetype |= bit
+
+    return archetype
+
+
+class ComponentStore:
+    """
+    The entities of a floor grouped by archetype, the set of components they have, so finding every entity
+    with certain components only looks at the groups that have them. The entities keep their components as
+    attributes; after one gains or loses a component the store is told with update.
+    """
+    def __init__(self, entities=()):
+        # archetype -> dense list of the entities that have exactly those components
+        self.archetypes = {}
+
+        # entity -> (archetype, index in its list), so an entity can be taken out without a search
+        self.places = {}
+
+        for entity in entities:
+            self.add(entity)
+
+    def add(self, entity):
+        archetype = get_archetype(entity)
+        members = self.archetypes.setdefault(archetype, [])
+
+        self.places[entity] = (archetype, len(members))
+        members.append(entity)
+
+    def remove(self, entity):
+        archetype, index = self.places.pop(entity)
+        members = self.archetypes[archetype]
+
+        # The last entity of the list fills the gap, so the list stays dense
+        last = members.pop()
+
+        if last is not entity:
+            members[index] = last
+            self.places[last] = (archetype, index)
+
+    def update(self, entity):
+        if get_archetype(entity) != self.places[entity][0]:
+            self.remove(entity)
+            self.add(entity)
+
+    def query(self, *components):
+        # Every entity that has all the given components
+        wanted = 0
+        for name in components:
+            wanted |= COMPONENT_BITS[name]
+
+        result = []
+
+        for archetype in sorted(self.archetypes):
+            if archetype & wanted == wanted:
+                result.extend(self.archetypes[archetype])
+
+        return result
+
+    def query_near(self, x, y, radius, *components):
+        # Every entity that has all the given components and is within radius of (x, y)
+        return [entity for entity in self.query(*components) if entity.distance(x, y) <= radius]
+
+    def __len__(self):
+        return len(self.places)
@@ -0,0 +1,39 @@
+"""
+Floor Pregenerator
+----
+Builds the next floor on a worker thread while the player is still exploring the current one,
+so taking the stairs only has to swap the finished floor in.
+"""
+import sys
+import threading
+import traceback
+
+
+class FloorPregenerator:
+    def __init__(self, build_floor, *args):
+        self.result = None
+        self.error = None
+
+        self.thread = threading.Thread(target=self.run, args=(build_floor,) + args, name='floor pregeneration')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self, build_floor, *args):
+        try:
+            self.result = build_floor(*args)
+        except Exception:
+            # Kept with its traceback, which would otherwise be lost with the thread, and reported by get
+            self.error = traceback.format_exc()
+
+    def wait(self):
+        self.thread.join()
+
+    def get(self):
+        # Wait for the floor if it is not finished yet. None if building it failed, and the floor is then built
+        # the usual way when the player takes the stairs, so a bug in the background work does not end the game.
+        self.wait()
+
+        if self.error:
+            sys.stderr.write('Building the next floor in the background failed:\n' + self.error)
+
+        return self.result
@@ -1,58 +1,97 @@
 import libtcodpy as libtcod
-from map_objects.tile import Tile
-from map_objects.rectangle import Rect
-
-from components.ai import BasicMonster
-from components.equipment import EquipmentSlots
-from components.equippable import Equippable
-from components.fighter import Fighter
-from components.item import Item
+from loader_functions.entity_templates import get_entity_templates
+from map_objects.component_store import ComponentStore
+from map_objects.floor_pregenerator import FloorPregenerator
+from map_objects.tile import Tiles
+from map_objects.rectangle import Rect, RectGrid
+from map_objects.spatial_index import SpatialIndex
+
 from components.stairs import Stairs
 
 from entity import Entity
+from fov_functions import BatchFov, initialize_fov
 from game_messages import Message
-from item_functions import heal, cast_lightning, cast_fireball, cast_confuse
-from random import randint
-from random_utils import from_dungeon_level, random_choice_from_dict
+from path_functions import ChaseField, initialize_path_map
+import random
+from random_utils import RandomStreams, WeightedChoice, floor_streams, from_dungeon_level
 from render_functions import RenderOrder
+from turn_scheduler import DormantMonsters, TurnScheduler
 
 
 class GameMap:
-    def __init__(self, width, height, dungeon_level=1):
+    def __init__(self, width, height, dungeon_level=1, rng=None):
         self.width = width
         self.height = height
         self.tiles = self.initialize_tiles()
+        self.tiles_version = 0
         self.dungeon_level = dungeon_level
+        self.rng = rng if rng is not None else RandomStreams()
+        self.entity_index = SpatialIndex()
+        self.component_store = ComponentStore()
+        self.scheduler = TurnScheduler()
+        self.dormant = DormantMonsters()
+        self.path_map = None
+        self.chase_field = None
+        self.monster_sight = None
+        self.floor_pregenerator = None
+        self.prebuilt_fov_map = None
+
+    def __setstate__(self, state):
+        # Only old shelve save games are unpickled, and their maps have none of what was added since. The indexes and
+        # the scheduler are filled from the entities once the game is loaded, and everyone starts out awake.
+        self.__dict__.update(state)
+        self.tiles_version = 0
+        self.rng = state.get('rng') or RandomStreams()
+        self.entity_index = SpatialIndex()
+        self.component_store = ComponentStore()
+        self.scheduler = TurnScheduler()
+        self.dormant = DormantMonsters()
+        self.path_map = None
+        self.chase_field = None
+        self.monster_sight = None
+        self.floor_pregenerator = None
+        self.prebuilt_fov_map = None
+
+        # Save games from before the tile arrays store the map as a list of lists of Tile objects
+        if not isinstance(self.tiles, Tiles):
+            self.tiles = Tiles.from_tile_grid(self.tiles)
 
     def initialize_tiles(self):
-        tiles = [[Tile(True) for y in range(self.height)] for x in range(self.width)]
+        tiles = Tiles(self.width, self.height)
 
         return tiles
 
-    def make_map(self, max_rooms, room_min_size, room_max_size, map_width, map_height, player, entities):
+    def make_map(self, max_rooms, room_min_size, room_max_size, map_width, map_height, player, entities, rng=random,
+                 spawn_rng=None):
+        # rng lays out the rooms and tunnels, spawn_rng fills them with monsters and items
+        if spawn_rng is None:
+            spawn_rng = rng
+
         rooms = []
         num_rooms = 0
 
+        # Every cell taken by a room so far, so a new room is checked against all of them in one go
+        taken = RectGrid(map_width, map_height)
+
         center_of_last_room_x = None
         center_of_last_room_y = None
 
+        # Index what is already on the floor, so that new entities are not placed on top of it
+        self.index_entities(entities)
+
         for r in range(max_rooms):
             # random width and height
-            w = randint(room_min_size, room_max_size)
-            h = randint(room_min_size, room_max_size)
+            w = rng.randint(room_min_size, room_max_size)
+            h = rng.randint(room_min_size, room_max_size)
             # random position without going out of the boundaries of the map
-            x = randint(0, map_width - w - 1)
-            y = randint(0, map_height - h - 1)
+            x = rng.randint(0, map_width - w - 1)
+            y = rng.randint(0, map_height - h - 1)
 
             # "Rect" creates rectangular rooms
             new_room = Rect(x, y, w, h)
 
-            # Check through the other rooms whether they intersect with this one
-            # If there's no intersections, this room is valid and we go to 'else'
-            for other_room in rooms:
-                if new_room.intersect(other_room):
-                    break
-            else:
+            # If it doesn't intersect any of the other rooms, this room is valid
+            if not taken.intersects(new_room):
                 # Carve out the room
                 self.create_room(new_room)
 
@@ -75,7 +114,7 @@ class GameMap:
                     (prev_x, prev_y) = rooms[num_rooms - 1].center()
 
                     # flip a coin (random number that is either 0 or 1)
-                    if randint(0, 1) == 1:
+                    if rng.randint(0, 1) == 1:
                         # first move horizontally, then vertically
                         self.create_h_tunnel(prev_x, new_x, prev_y)
                         self.create_v_tunnel(prev_y, new_y, new_x)
@@ -86,9 +125,10 @@ class GameMap:
 
                 # Don't create monsters in the first room
                 if num_rooms > 0:
-                    self.place_entities(new_room, entities)
+                    self.place_entities(new_room, entities, spawn_rng)
                 # finally, append the new room to the list
                 rooms.append(new_room)
+                taken.add(new_room)
                 num_rooms += 1
 
         # Add stairs down to the last room created
@@ -97,134 +137,301 @@ class GameMap:
                              render_order=RenderOrder.STAIRS, stairs=stairs_component)
         entities.append(down_stairs)
 
+        # The player was moved into the first room after being indexed, so index everything again
+        self.index_entities(entities)
+
     """
     Creating a rectangular room with the provided coordinates.
     """
 
     def create_room(self, room):
-        # go through the tiles in the rectangle and make them passable
-        for x in range(room.x1 + 1, room.x2):
-            for y in range(room.y1 + 1, room.y2):
-                self.tiles[x][y].blocked = False
-                self.tiles[x][y].block_sight = False
+        # make the tiles inside the rectangle passable, leaving the edges as walls
+        self.tiles.carve(room.x1 + 1, room.y1 + 1, room.x2, room.y2)
 
     """
     Creating straight tunnels, horizontal and vertical 
     """
 
     def create_h_tunnel(self, x1, x2, y):
-        for x in range(min(x1, x2), max(x1, x2) + 1):
-            self.tiles[x][y].blocked = False
-            self.tiles[x][y].block_sight = False
+        self.tiles.carve(min(x1, x2), y, max(x1, x2) + 1, y + 1)
 
     def create_v_tunnel(self, y1, y2, x):
-        for y in range(min(y1, y2), max(y1, y2) + 1):
-            self.tiles[x][y].blocked = False
-            self.tiles[x][y].block_sight = False
+        self.tiles.carve(x, min(y1, y2), x + 1, max(y1, y2) + 1)
 
     """
     Place monsters and items into rooms
     """
 
-    def place_entities(self, room, entities):
-        max_monsters_per_room = from_dungeon_level([[2, 1], [3, 4], [5, 6]], self.dungeon_level)
-        max_items_per_room = from_dungeon_level([[1, 1], [2, 4]], self.dungeon_level)
+    def place_entities(self, room, entities, rng=random):
+        spawn_table = get_spawn_table(self.dungeon_level)
 
         # Get a random number for monsters and items
-        number_of_monsters = randint(0, max_monsters_per_room)
-        number_of_items = randint(0, max_items_per_room)
-
-        monster_chances = {
-            'orc': 80,
-            'troll': from_dungeon_level([[15, 3], [30, 5], [60, 7]], self.dungeon_level)
-        }
-
-        item_chances = {
-            'healing_potion': 35,
-            'sword': from_dungeon_level([[5, 4]], self.dungeon_level),
-            'shield': from_dungeon_level([[15, 8]], self.dungeon_level),
-            'lightning_scroll': from_dungeon_level([[25, 4]], self.dungeon_level),
-            'fireball_scroll': from_dungeon_level([[25, 6]], self.dungeon_level),
-            'confusion_scroll': from_dungeon_level([[10, 2]], self.dungeon_level)
-        }
+        number_of_monsters = rng.randint(0, spawn_table.max_monsters_per_room)
+        number_of_items = rng.randint(0, spawn_table.max_items_per_room)
 
         for i in range(number_of_monsters):
             # Choose a random location in the room
-            x = randint(room.x1 + 1, room.x2 - 1)
-            y = randint(room.y1 + 1, room.y2 - 1)
-
-            """
-            1 in 5 enemies statistically is a troll, otherwise it's an orc.
-            """
-            if not any([entity for entity in entities if entity.x == x and entity.y == y]):
-                monster_choice = random_choice_from_dict(monster_chances)
-                if monster_choice == 'orc':
-                    fighter_component = Fighter(hp=20, defense=0, power=4, xp=35)
-                    ai_component = BasicMonster()
-
-                    monster = Entity(x, y, 'o', libtcod.desaturated_green, 'Orc', blocks=True,
-                                     render_order=RenderOrder.ACTOR, fighter=fighter_component, ai=ai_component)
-                else:
-                    fighter_component = Fighter(hp=30, defense=1, power=8, xp=100)
-                    ai_component = BasicMonster()
+            x = rng.randint(room.x1 + 1, room.x2 - 1)
+            y = rng.randint(room.y1 + 1, room.y2 - 1)
 
-                    monster = Entity(x, y, 'T', libtcod.darker_green, 'Troll', blocks=True, fighter=fighter_component,
-                                     render_order=RenderOrder.ACTOR, ai=ai_component)
+            if not self.get_entities_at(x, y):
+                monster = spawn_table.monster_factories[spawn_table.monster_choice.choose(rng)](x, y)
 
                 entities.append(monster)
+                self.entity_index.add(monster)
 
         # Place items in the dungeon too
         for i in range(number_of_items):
-            x = randint(room.x1 + 1, room.x2 - 1)
-            y = randint(room.y1 + 1, room.y2 - 1)
+            x = rng.randint(room.x1 + 1, room.x2 - 1)
+            y = rng.randint(room.y1 + 1, room.y2 - 1)
 
             # Don't place entities in the same square
-            if not any([entity for entity in entities if entity.x == x and entity.y == y]):
-                item_choice = random_choice_from_dict(item_chances)
-
-                if item_choice == 'healing_potion':
-                    item_component = Item(use_function=heal, amount=40)
-                    item = Entity(x, y, '!', libtcod.violet, 'Healing Potion', render_order=RenderOrder.ITEM,
-                                  item=item_component)
-                elif item_choice == 'sword':
-                    equippable_component = Equippable(EquipmentSlots.MAIN_HAND, power_bonus=3)
-                    item = Entity(x, y, '/', libtcod.sky, 'Sword', equippable=equippable_component)
-                elif item_choice == 'shield':
-                    equippable_component = Equippable(EquipmentSlots.OFF_HAND, defense_bonus=1)
-                    item = Entity(x, y, '[', libtcod.darker_orange, 'Shield', equippable=equippable_component)
-                elif item_choice == 'fireball_scroll':
-                    item_component = Item(use_function=cast_fireball, targeting=True, targeting_message=Message(
-                        'Left-click a target tile for the fireball, or right-click to cancel.', libtcod.light_cyan),
-                                          damage=25, radius=3)
-                    item = Entity(x, y, '#', libtcod.red, 'Fireball Scroll', render_order=RenderOrder.ITEM,
-                                  item=item_component)
-                elif item_choice == 'confusion_scroll':
-                    item_component = Item(use_function=cast_confuse, targeting=True, targeting_message=Message(
-                        'Left-click an enemy to confuse it, or right-click to cancel.', libtcod.light_cyan))
-                    item = Entity(x, y, '#', libtcod.light_pink, 'Confusion Scroll', render_order=RenderOrder.ITEM,
-                                  item=item_component)
-                else:
-                    item_component = Item(use_function=cast_lightning, damage=40, maximum_range=5)
-                    item = Entity(x, y, '#', libtcod.yellow, 'Lightning Scroll', render_order=RenderOrder.ITEM,
-                                  item=item_component)
+            if not self.get_entities_at(x, y):
+                item = spawn_table.item_factories[spawn_table.item_choice.choose(rng)](x, y)
+
                 entities.append(item)
+                self.entity_index.add(item)
+
+    """
+    Every entity on the floor is kept in a spatial index, so looking up what is on a cell is a dictionary lookup,
+    and in the component store, so finding every entity with some component does not mean going through all of them.
+    The ones with an AI are also kept in the turn scheduler.
+    Entities entering or leaving the floor outside of map generation go through add_entity and remove_entity.
+    """
+
+    def index_entities(self, entities):
+        self.entity_index = SpatialIndex(entities)
+        self.component_store = ComponentStore(entities)
+        self.scheduler = TurnScheduler(entities)
+        self.dormant = DormantMonsters()
+
+    def add_entity(self, entity):
+        self.entity_index.add(entity)
+        self.component_store.add(entity)
+
+        if entity.ai:
+            self.scheduler.add(entity)
+
+    def remove_entity(self, entity):
+        self.entity_index.remove(entity)
+        self.component_store.remove(entity)
+        self.scheduler.remove(entity)
+        self.dormant.remove(entity)
+
+    def components_changed(self, entity):
+        # An entity gained or lost a component
+        self.component_store.update(entity)
+
+    def update_activity(self, x, y, radius):
+        # Monsters further than radius from (x, y) fall asleep and leave the turn order,
+        # sleeping ones that are now within radius wake up and take their turns again
+        for entity in self.scheduler.actors():
+            if (entity.x - x) ** 2 + (entity.y - y) ** 2 > radius * radius:
+                self.scheduler.remove(entity)
+                self.dormant.add(entity)
+
+        for entity in self.dormant.pop_near(x, y, radius):
+            self.scheduler.add(entity)
+
+    def get_entities_at(self, x, y):
+        return self.entity_index.get(x, y)
+
+    def get_blocking_entity_at(self, x, y):
+        return self.entity_index.get_blocking(x, y)
+
+    def get_entities_with(self, *components):
+        return self.component_store.query(*components)
+
+    def get_entities_near(self, x, y, radius, *components):
+        return self.component_store.query_near(x, y, radius, *components)
+
+    """
+    The path map is built once per floor and then kept up to date,
+    one cell at a time, as tiles change and blocking entities move or die.
+    """
+
+    def initialize_path_map(self, entities):
+        if self.path_map:
+            libtcod.map_delete(self.path_map)
+
+        self.path_map = initialize_path_map(self, entities)
+
+    def update_path_cell(self, x, y, occupied):
+        libtcod.map_set_properties(self.path_map, x, y, not self.tiles.block_sight[x, y],
+                                   not (occupied or self.tiles.blocked[x, y]))
+
+    def entity_moved(self, entity, old_x, old_y):
+        self.entity_index.move(entity, old_x, old_y)
+
+        if entity.blocks and self.path_map:
+            self.update_path_cell(old_x, old_y, False)
+            self.update_path_cell(entity.x, entity.y, True)
+
+    def entity_unblocked(self, entity):
+        if self.path_map:
+            self.update_path_cell(entity.x, entity.y, False)
+
+    def set_chase_goal(self, x, y):
+        # One distance map towards (x, y) for all the chasing monsters, worked out when the first of them needs it
+        if not self.chase_field:
+            self.chase_field = ChaseField(self)
+
+        self.chase_field.set_goal(x, y)
+
+    def compute_monster_sight(self, radius, light_walls=True):
+        # What every awake monster can see, worked out for all of them at once
+        self.monster_sight = BatchFov(~self.tiles.block_sight, self.scheduler.actors(), radius, light_walls)
+
+    def can_see(self, entity, x, y):
+        return self.monster_sight.can_see(entity, x, y)
+
+    def set_tile(self, x, y, blocked, block_sight=None):
+        if block_sight is None:
+            block_sight = blocked
+
+        if self.path_map:
+            # An open tile that the path map says is unwalkable has a blocking entity standing on it
+            occupied = not (self.tiles.blocked[x, y] or libtcod.map_is_walkable(self.path_map, x, y))
+
+        self.tiles.blocked[x, y] = blocked
+        self.tiles.block_sight[x, y] = block_sight
+        self.tiles_version += 1
+
+        if self.path_map:
+            self.update_path_cell(x, y, occupied)
+
+        if self.chase_field:
+            self.chase_field.set_walkable(x, y, not blocked)
 
     def is_blocked(self, x, y):
-        if self.tiles[x][y].blocked:
+        if self.tiles.blocked[x, y]:
             return True
 
         return False
 
     def next_floor(self, player, message_log, constants):
         self.dungeon_level += 1
-        entities = [player]
 
-        self.tiles = self.initialize_tiles()
-        self.make_map(constants['max_rooms'], constants['room_min_size'], constants['room_max_size'],
-                      constants['map_width'], constants['map_height'], player, entities)
+        self.chase_field = None
+
+        self.monster_sight = None
+
+        floor = self.floor_pregenerator.get() if self.floor_pregenerator else None
+        self.floor_pregenerator = None
+        self.tiles_version += 1
+
+        if floor and floor[0].dungeon_level == self.dungeon_level:
+            entities = self.swap_in_floor(floor, player)
+        else:
+            entities = [player]
+
+            self.tiles = self.initialize_tiles()
+            self.make_map(constants['max_rooms'], constants['room_min_size'], constants['room_max_size'],
+                          constants['map_width'], constants['map_height'], player, entities,
+                          *floor_streams(self.rng.seed, self.dungeon_level))
+            self.initialize_path_map(entities)
 
         player.fighter.heal(player.fighter.max_hp // 2)
 
         message_log.add_message(Message('You take a moment to rest, and recover your strength.', libtcod.light_violet))
 
+        self.pregenerate_next_floor(constants)
+
+        return entities
+
+    """
+    The floor below is built ahead of time on a worker thread. It is built from the random number streams
+    of its dungeon level, so it comes out the same as if it were built when the stairs are taken.
+    """
+
+    def pregenerate_next_floor(self, constants):
+        if not constants['pregenerate_floors'] or self.floor_pregenerator:
+            return
+
+        self.floor_pregenerator = FloorPregenerator(build_floor, self.dungeon_level + 1, constants, self.rng.seed)
+
+    def wait_for_pregeneration(self):
+        # Let a floor still being built finish, so the thread is not cut off when the game exits
+        if self.floor_pregenerator:
+            self.floor_pregenerator.wait()
+
+    def swap_in_floor(self, floor, player):
+        prebuilt_map, prebuilt_entities, stand_in, fov_map = floor
+
+        # The player takes the place of the stand-in the floor was built around
+        player.x, player.y = stand_in.x, stand_in.y
+        entities = [player if entity is stand_in else entity for entity in prebuilt_entities]
+
+        if self.path_map:
+            libtcod.map_delete(self.path_map)
+
+        self.tiles = prebuilt_map.tiles
+        self.path_map = prebuilt_map.path_map
+        self.prebuilt_fov_map = fov_map
+        self.index_entities(entities)
+
         return entities
+
+    def take_prebuilt_fov_map(self):
+        # The FOV map that came with a pregenerated floor, or None. It is handed out only once.
+        fov_map = self.prebuilt_fov_map
+        self.prebuilt_fov_map = None
+
+        # It was made for the map the floor was built on, whose tiles this map now has
+        if fov_map is not None:
+            fov_map.game_map = self
+            fov_map.tiles_version = self.tiles_version
+
+        return fov_map
+
+
+class SpawnTable:
+    """
+    How many monsters and items a room can get on a dungeon level, the chances of each kind,
+    and the factories that build them, all taken from the entity templates
+    """
+    def __init__(self, dungeon_level, templates):
+        self.max_monsters_per_room = from_dungeon_level(templates.max_monsters_per_room, dungeon_level)
+        self.max_items_per_room = from_dungeon_level(templates.max_items_per_room, dungeon_level)
+
+        monster_chances = {}
+        for name, chance in templates.monster_chances:
+            monster_chances[name] = from_dungeon_level(chance, dungeon_level)
+
+        item_chances = {}
+        for name, chance in templates.item_chances:
+            item_chances[name] = from_dungeon_level(chance, dungeon_level)
+
+        self.monster_choice = WeightedChoice(monster_chances)
+        self.item_choice = WeightedChoice(item_chances)
+
+        self.monster_factories = templates.monster_factories
+        self.item_factories = templates.item_factories
+
+
+# Spawn tables by dungeon level, each one built the first time a floor of that level is generated
+spawn_tables = {}
+
+
+def get_spawn_table(dungeon_level):
+    spawn_table = spawn_tables.get(dungeon_level)
+
+    if spawn_table is None:
+        spawn_table = spawn_tables[dungeon_level] = SpawnTable(dungeon_level, get_entity_templates())
+
+    return spawn_table
+
+
+def build_floor(dungeon_level, constants, seed):
+    # Runs on the floor pregenerator's thread, so it only touches objects of its own
+    rng, spawn_rng = floor_streams(seed, dungeon_level)
+
+    game_map = GameMap(constants['map_width'], constants['map_height'], dungeon_level, RandomStreams(seed))
+    stand_in = Entity(0, 0, '@', libtcod.white, 'Player', blocks=True, render_order=RenderOrder.ACTOR)
+    entities = [stand_in]
+
+    game_map.make_map(constants['max_rooms'], constants['room_min_size'], constants['room_max_size'],
+                      constants['map_width'], constants['map_height'], stand_in, entities, rng, spawn_rng)
+    game_map.initialize_path_map(entities)
+
+    return game_map, entities, stand_in, initialize_fov(game_map)
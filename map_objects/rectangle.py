@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class Rect:
     def __init__(self, x, y, w, h):
         self.x1 = x
@@ -14,3 +17,19 @@ class Rect:
         # returns true if this rectangle intersects with another one
         return (self.x1 <= other.x2 and self.x2 >= other.x1 and
                 self.y1 <= other.y2 and self.y2 >= other.y1)
+
+
+class RectGrid:
+    """
+    The cells covered by a set of rectangles, edges included, so checking a new rectangle against all of them
+    is one look at the cells under it instead of a Rect.intersect call for each one.
+    """
+    def __init__(self, width, height):
+        self.covered = np.zeros((width, height), dtype=bool)
+
+    def intersects(self, rect):
+        # The same answer Rect.intersect gives against every rectangle added so far
+        return self.covered[rect.x1:rect.x2 + 1, rect.y1:rect.y2 + 1].any()
+
+    def add(self, rect):
+        self.covered[rect.x1:rect.x2 + 1, rect.y1:rect.y2 + 1] = True
@@ -0,0 +1,38 @@
+class SpatialIndex:
+    """
+    Entities bucketed by their (x, y) position, so finding what stands on a cell
+    does not mean scanning every entity on the floor.
+    """
+    def __init__(self, entities=()):
+        self.cells = {}
+
+        for entity in entities:
+            self.add(entity)
+
+    def add(self, entity):
+        self.cells.setdefault((entity.x, entity.y), []).append(entity)
+
+    def remove(self, entity, x=None, y=None):
+        # The position can be given when the entity has already moved away from it
+        if x is None:
+            x, y = entity.x, entity.y
+
+        bucket = self.cells[(x, y)]
+        bucket.remove(entity)
+
+        if not bucket:
+            del self.cells[(x, y)]
+
+    def move(self, entity, old_x, old_y):
+        self.remove(entity, old_x, old_y)
+        self.add(entity)
+
+    def get(self, x, y):
+        return self.cells.get((x, y), ())
+
+    def get_blocking(self, x, y):
+        for entity in self.cells.get((x, y), ()):
+            if entity.blocks:
+                return entity
+
+        return None
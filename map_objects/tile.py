@@ -1,7 +1,14 @@
-class Tile:
+import numpy as np
+
+from slotted import Slotted
+
+
+class Tile(Slotted):
     """
     A tile on a map. It may or may not be blocked, and may or may not block sight.
     """
+    __slots__ = ('blocked', 'block_sight', 'explored')
+
     def __init__(self, blocked, block_sight=None):
         self.blocked = blocked
 
@@ -12,3 +19,90 @@ class Tile:
         self.block_sight = block_sight
 
         self.explored = False
+
+
+class Tiles:
+    """
+    All the tiles of a map, stored as one boolean array per property instead of one Tile object per cell.
+    The arrays are indexed [x, y]. tiles[x][y] still works and returns a view that reads and writes the arrays.
+    """
+    def __init__(self, width, height, blocked=True):
+        self.width = width
+        self.height = height
+
+        self.blocked = np.full((width, height), blocked, dtype=bool)
+        self.block_sight = self.blocked.copy()
+        self.explored = np.zeros((width, height), dtype=bool)
+
+    @classmethod
+    def from_tile_grid(cls, tile_grid):
+        # Convert an old list-of-lists of Tile objects (from an old save game) into arrays
+        tiles = cls(len(tile_grid), len(tile_grid[0]))
+
+        tiles.blocked[:] = [[tile.blocked for tile in column] for column in tile_grid]
+        tiles.block_sight[:] = [[tile.block_sight for tile in column] for column in tile_grid]
+        tiles.explored[:] = [[tile.explored for tile in column] for column in tile_grid]
+
+        return tiles
+
+    def __len__(self):
+        return self.width
+
+    def __getitem__(self, x):
+        return TileColumn(self, x)
+
+    def carve(self, x1, y1, x2, y2):
+        # Make every tile in the rectangle [x1, x2) x [y1, y2) passable in one go
+        self.blocked[x1:x2, y1:y2] = False
+        self.block_sight[x1:x2, y1:y2] = False
+
+
+class TileColumn:
+    """
+    One column of Tiles, so that tiles[x][y] keeps working.
+    """
+    def __init__(self, tiles, x):
+        self.tiles = tiles
+        self.x = x
+
+    def __len__(self):
+        return self.tiles.height
+
+    def __getitem__(self, y):
+        return TileView(self.tiles, self.x, y)
+
+
+class TileView(object):
+    """
+    A single tile of Tiles. Reading or setting an attribute goes straight to the arrays.
+    """
+    __slots__ = ('tiles', 'x', 'y')
+
+    def __init__(self, tiles, x, y):
+        self.tiles = tiles
+        self.x = x
+        self.y = y
+
+    @property
+    def blocked(self):
+        return bool(self.tiles.blocked[self.x, self.y])
+
+    @blocked.setter
+    def blocked(self, value):
+        self.tiles.blocked[self.x, self.y] = value
+
+    @property
+    def block_sight(self):
+        return bool(self.tiles.block_sight[self.x, self.y])
+
+    @block_sight.setter
+    def block_sight(self, value):
+        self.tiles.block_sight[self.x, self.y] = value
+
+    @property
+    def explored(self):
+        return bool(self.tiles.explored[self.x, self.y])
+
+    @explored.setter
+    def explored(self, value):
+        self.tiles.explored[self.x, self.y] = value
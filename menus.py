@@ -5,6 +5,8 @@ All the menus that we have in the game are implemented here
 """
 import libtcodpy as libtcod
 
+from equipment_slots import SLOT_NAMES
+
 
 def menu(con, header, options, width, screen_width, screen_height):
     if len(options) > 26: raise ValueError('Cannot have a menu with more than 26 options.')
@@ -43,10 +45,8 @@ def inventory_menu(con, header, player, inventory_width, screen_width, screen_he
         options = []
 
         for item in player.inventory.items:
-            if player.equipment.main_hand == item:
-                options.append('{0} (on main hand)'.format(item.name))
-            elif player.equipment.off_hand == item:
-                options.append('{0} (on off hand)'.format(item.name))
+            if player.equipment.is_equipped(item):
+                options.append('{0} (on {1})'.format(item.name, SLOT_NAMES[item.equippable.slot]))
             else:
                 options.append(item.name)
 
@@ -0,0 +1,114 @@
+"""
+Path Functions
+----
+The walkability map the monsters use to find their way around a floor
+"""
+import libtcodpy as libtcod
+import numpy as np
+
+
+def initialize_walk_map(game_map):
+    walk_map = libtcod.map_new(game_map.width, game_map.height)
+
+    # A new map starts out fully opaque and unwalkable, so only the open tiles need to be set
+    transparent = ~game_map.tiles.block_sight
+    walkable = ~game_map.tiles.blocked
+    xs, ys = np.nonzero(transparent | walkable)
+
+    for x, y in zip(xs.tolist(), ys.tolist()):
+        libtcod.map_set_properties(walk_map, x, y, transparent.item(x, y), walkable.item(x, y))
+
+    return walk_map
+
+
+def initialize_path_map(game_map, entities):
+    # Start from the walls of the floor
+    path_map = initialize_walk_map(game_map)
+
+    # Every blocking entity is a wall until it moves or dies
+    for entity in entities:
+        if entity.blocks:
+            libtcod.map_set_properties(path_map, entity.x, entity.y,
+                                       not game_map.tiles.block_sight[entity.x, entity.y], False)
+
+    return path_map
+
+
+class ChaseField:
+    """
+    A map of walking distances to a single goal, usually the player, in steps, diagonal ones included.
+    Every chasing monster steps downhill on it, instead of each one running its own A* search towards the
+    same goal. It is only worked out when a monster asks for a distance after the goal or the walls changed,
+    and only as far out as max_distance, the furthest a monster follows a path, so turns where nobody chases
+    cost nothing and the rest cost the same on any size of map.
+    """
+    def __init__(self, game_map, max_distance=25):
+        # Only the walls count here, monsters step around each other when they follow the field
+        self.walkable = ~game_map.tiles.blocked
+        self.max_distance = max_distance
+        self.goal = None
+        self.stale = True
+
+        # The distances around the goal, -1 where it cannot be reached within max_distance,
+        # and the map position of their [0, 0]
+        self.distances = None
+        self.x1 = self.y1 = 0
+
+    def set_goal(self, x, y):
+        if (x, y) != self.goal:
+            self.goal = (x, y)
+            self.stale = True
+
+    def compute(self):
+        # A breadth-first search from the goal, one whole ring of steps at a time
+        x, y = self.goal
+        width, height = self.walkable.shape
+        self.x1, x2 = max(x - self.max_distance, 0), min(x + self.max_distance + 1, width)
+        self.y1, y2 = max(y - self.max_distance, 0), min(y + self.max_distance + 1, height)
+
+        walkable = self.walkable[self.x1:x2, self.y1:y2]
+        distances = np.full(walkable.shape, -1, dtype=np.int32)
+        reached = np.zeros(walkable.shape, dtype=bool)
+        ring = np.zeros(walkable.shape, dtype=bool)
+
+        ring[x - self.x1, y - self.y1] = True
+        reached |= ring
+        distances[ring] = 0
+
+        for distance in range(1, self.max_distance + 1):
+            # Every cell one step from the ring, straight or diagonal, spread along x and then along y
+            grown = ring.copy()
+            grown[1:] |= ring[:-1]
+            grown[:-1] |= ring[1:]
+
+            spread = grown.copy()
+            spread[:, 1:] |= grown[:, :-1]
+            spread[:, :-1] |= grown[:, 1:]
+
+            ring = spread & walkable & ~reached
+
+            if not ring.any():
+                break
+
+            reached |= ring
+            distances[ring] = distance
+
+        self.distances = distances
+        self.stale = False
+
+    def distance(self, x, y):
+        if self.stale:
+            self.compute()
+
+        # -1 for walls and cells the goal cannot be reached from within max_distance
+        x -= self.x1
+        y -= self.y1
+
+        if 0 <= x < self.distances.shape[0] and 0 <= y < self.distances.shape[1]:
+            return self.distances.item(x, y)
+
+        return -1
+
+    def set_walkable(self, x, y, walkable):
+        self.walkable[x, y] = walkable
+        self.stale = True
@@ -2,22 +2,55 @@
 Random Utilities
 ----
 We want to make randomizing and adding new items easier,
-and here are the tools to make this random choice easier and faster
+and here are the tools to make this random choice easier and faster.
+Every game also gets its own set of seeded random number streams, one for each part of the game.
 """
-from random import randint
+from bisect import bisect_left
+import random
 
+# The random number streams of a game. Each is seeded from the game's seed and its name, so drawing more
+# from one of them never changes what comes out of the others.
+STREAMS = ('mapgen', 'spawning', 'ai', 'combat', 'flavor')
 
-def random_choice_index(chances):
-    random_chance = randint(1, sum(chances))
+# The streams that run for the whole game, and are kept in save games.
+# mapgen and spawning start over on every floor, from the dungeon level.
+# combat is reserved: fights do not roll dice yet, so nothing draws from it. It is kept so that random combat
+# can be added without changing the seeds of the other streams or the layout of save games.
+GAME_STREAMS = ('ai', 'combat', 'flavor')
 
-    running_sum = 0
-    choice = 0
-    for w in chances:
-        running_sum += w
 
-        if random_chance <= running_sum:
-            return choice
-        choice += 1
+def new_stream(seed, name, dungeon_level=0):
+    return random.Random((seed * 0x10000 + dungeon_level) * len(STREAMS) + STREAMS.index(name))
+
+
+def floor_streams(seed, dungeon_level):
+    # The streams a floor is built with, for the map and for the monsters and items on it.
+    # A floor comes out the same whenever it is built, ahead of time or when the stairs are taken.
+    return new_stream(seed, 'mapgen', dungeon_level), new_stream(seed, 'spawning', dungeon_level)
+
+
+class RandomStreams:
+    """
+    The random numbers of one game, all derived from a single seed, so two games with the same seed play out
+    the same. ai, combat and flavor are random.Random instances for monster behaviour, fights (reserved, see
+    GAME_STREAMS), and everything that is just for show. The map and spawning streams of each floor come from floor_streams.
+    """
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.getrandbits(32)
+
+        # Seeds are kept to 64 bits so they fit in a save game
+        self.seed = seed % (1 << 64)
+
+        for name in GAME_STREAMS:
+            setattr(self, name, new_stream(self.seed, name))
+
+    def getstate(self):
+        return [getattr(self, name).getstate() for name in GAME_STREAMS]
+
+    def setstate(self, states):
+        for name, state in zip(GAME_STREAMS, states):
+            getattr(self, name).setstate(state)
 
 
 def from_dungeon_level(table, dungeon_level):
@@ -28,8 +61,29 @@ def from_dungeon_level(table, dungeon_level):
     return 0
 
 
-def random_choice_from_dict(choice_dict):
-    choices = list(choice_dict.keys())
-    chances = list(choice_dict.values())
+class WeightedChoice:
+    """
+    A random choice from a dict of choice -> chance, for a dict that is used over and over. The running sums are
+    worked out once, and each draw is a binary search over them.
+    """
+    def __init__(self, choice_dict):
+        self.choices = list(choice_dict.keys())
+        self.running_sums = []
+
+        running_sum = 0
+        for w in choice_dict.values():
+            running_sum += w
+            self.running_sums.append(running_sum)
+
+        self.total = running_sum
+
+    def choose(self, rng=random):
+        return self.choices[bisect_left(self.running_sums, rng.randint(1, self.total))]
+
+    def choose_many(self, k, rng=random):
+        # k draws in one call, the same picks as k calls to choose
+        running_sums = self.running_sums
+        choices = self.choices
+        total = self.total
 
-    return choices[random_choice_index(chances)]
+        return [choices[bisect_left(running_sums, rng.randint(1, total))] for i in range(k)]
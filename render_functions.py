@@ -6,6 +6,8 @@ not including menus that have their own file.
 """
 
 import libtcodpy as libtcod
+import numpy as np
+
 from game_states import enum
 from game_states import GameStates
 
@@ -16,14 +18,20 @@ RenderOrder = enum(STAIRS=1,
                    ITEM=3,
                    ACTOR=4)
 
+# Number of changed cells above which the whole map background is uploaded at once
+BACKGROUND_FILL_THRESHOLD = 64
+
 
-def get_names_under_mouse(mouse, entities, fov_map):
+def get_names_under_mouse(mouse, game_map, fov_map):
     (x, y) = (mouse.cx, mouse.cy)
 
     # Create a list of entity names under the mouse cursor
-    names = [entity.name for entity in entities
-             if entity.x == x and entity.y == y and libtcod.map_is_in_fov(fov_map, entity.x, entity.y)]
-    names = ', '.join(names)
+    entities_under_mouse = game_map.get_entities_at(x, y)
+
+    if entities_under_mouse and fov_map.is_in_fov(x, y):
+        names = ', '.join([entity.name for entity in entities_under_mouse])
+    else:
+        names = ''
 
     return names.capitalize()
 
@@ -48,38 +56,32 @@ def render_bar(panel, x, y, total_width, name, value, maximum, bar_color, back_c
                              '{0}: {1}/{2}'.format(name, value, maximum))
 
 
+class RenderState:
+    """
+    Remembers what has been drawn on the map console, so that render_all only redraws
+    the cells whose visibility, explored state or occupant changed since the last frame.
+    Make a new one whenever the map console is cleared, the first frame drawn with it then draws everything.
+    """
+    def __init__(self, width, height):
+        self.visible = np.zeros((width, height), dtype=bool)
+        self.explored = np.zeros((width, height), dtype=bool)
+
+        # The (x, y) of every cell in view, where entities are looked up each frame
+        self.visible_cells = []
+
+        # (x, y) -> (char, color) of every entity currently drawn on the console
+        self.drawn = {}
+
+
 """
 Render the map and everything in it
 """
 
 
-def render_all(con, panel, entities, player, game_map, fov_map, fov_recompute, message_log, screen_width, screen_height,
-               bar_width, panel_height, panel_y, mouse, colors, game_state):
-    # Draw all the tiles in the game map
-    if fov_recompute:
-        for y in range(game_map.height):
-            for x in range(game_map.width):
-                visible = libtcod.map_is_in_fov(fov_map, x, y)
-                wall = game_map.tiles[x][y].block_sight
-
-                if visible:
-                    if wall:
-                        libtcod.console_set_char_background(con, x, y, colors.get('light_wall'), libtcod.BKGND_SET)
-                    else:
-                        libtcod.console_set_char_background(con, x, y, colors.get('light_ground'), libtcod.BKGND_SET)
-                    game_map.tiles[x][y].explored = True
-                elif game_map.tiles[x][y].explored:
-                    if wall:
-                        libtcod.console_set_char_background(con, x, y, colors.get('dark_wall'), libtcod.BKGND_SET)
-                    else:
-                        libtcod.console_set_char_background(con, x, y, colors.get('dark_ground'), libtcod.BKGND_SET)
-
-    # Sort the entities in the order they're supposed to be drawn
-    entities_in_render_order = sorted(entities, key=getkey)
-
-    # Draw all entities in the list
-    for entity in entities_in_render_order:
-        draw_entity(con, entity, fov_map, game_map)
+def render_all(con, panel, player, game_map, fov_map, fov_recompute, message_log, screen_width, screen_height,
+               bar_width, panel_height, panel_y, mouse, colors, game_state, render_state):
+    # Only redraw what changed since the last frame
+    render_changes(con, game_map, fov_map, fov_recompute, colors, render_state)
 
     # Put everything on the screen
     libtcod.console_blit(con, 0, 0, screen_width, screen_height, 0, 0, 0)
@@ -123,28 +125,106 @@ def render_all(con, panel, entities, player, game_map, fov_map, fov_recompute, m
 
     libtcod.console_set_default_foreground(panel, libtcod.light_gray)
     libtcod.console_print_ex(panel, 1, 0, libtcod.BKGND_NONE, libtcod.LEFT,
-                             get_names_under_mouse(mouse, entities, fov_map))
+                             get_names_under_mouse(mouse, game_map, fov_map))
 
     libtcod.console_blit(panel, 0, 0, screen_width, panel_height, 0, 0, panel_y)
 
 
-def clear_all(con, entities):
-    for entity in entities:
-        clear_entity(con, entity)
+def render_changes(con, game_map, fov_map, fov_recompute, colors, render_state):
+    tiles = game_map.tiles
+
+    if fov_recompute:
+        visible = fov_map.visible
+        tiles.explored |= visible
+
+        # Redraw the background of the cells that came into or went out of sight, or were explored by other means
+        changed = (visible != render_state.visible) | (tiles.explored != render_state.explored)
+
+        xs, ys = np.nonzero(changed)
+
+        # Past a handful of cells, uploading the whole background in one call is cheaper than a call per cell
+        if len(xs) > BACKGROUND_FILL_THRESHOLD:
+            fill_map_background(con, game_map, visible, colors)
+        else:
+            for x, y in zip(xs.tolist(), ys.tolist()):
+                draw_tile(con, x, y, visible.item(x, y), tiles.block_sight.item(x, y), colors)
 
+        render_state.visible = visible
+        render_state.explored = tiles.explored.copy()
 
-def draw_entity(con, entity, fov_map, game_map):
-    # If the map square is within eyesight of the player, or it's the stairs after they've been seen once, draw it.
-    if libtcod.map_is_in_fov(fov_map, entity.x, entity.y) or (
-                entity.stairs and game_map.tiles[entity.x][entity.y].explored):
-        libtcod.console_set_default_foreground(con, entity.color)
-        libtcod.console_put_char(con, entity.x, entity.y, entity.char, libtcod.BKGND_NONE)
+        xs, ys = np.nonzero(visible)
+        render_state.visible_cells = list(zip(xs.tolist(), ys.tolist()))
 
+    # Work out what should be on top of each cell in view, from what stands there, so the cost of a frame
+    # depends on how much is in view and not on how many entities the floor has.
+    # Entities later in render order cover earlier ones.
+    wanted = {}
+    for x, y in render_state.visible_cells:
+        top = None
 
-def clear_entity(con, entity):
-    # erase the character that represents this object
-    libtcod.console_put_char(con, entity.x, entity.y, ' ', libtcod.BKGND_NONE)
+        for entity in game_map.get_entities_at(x, y):
+            if top is None or entity.render_order >= top.render_order:
+                top = entity
 
+        if top:
+            wanted[(x, y)] = (top.char, top.color)
 
-def getkey(entity):
-    return entity.render_order
+    # Stairs stay on the map once they have been seen
+    for entity in game_map.get_entities_with('stairs'):
+        if (entity.x, entity.y) not in wanted and tiles.explored[entity.x, entity.y]:
+            wanted[(entity.x, entity.y)] = (entity.char, entity.color)
+
+    drawn = render_state.drawn
+
+    # Erase the characters that are no longer there
+    for (x, y) in drawn:
+        if (x, y) not in wanted:
+            libtcod.console_put_char(con, x, y, ' ', libtcod.BKGND_NONE)
+
+    # Draw only the characters that are new or look different
+    for (x, y), (char, color) in wanted.items():
+        old = drawn.get((x, y))
+
+        if old is None or old[0] != char or old[1] is not color:
+            libtcod.console_set_default_foreground(con, color)
+            libtcod.console_put_char(con, x, y, char, libtcod.BKGND_NONE)
+
+    render_state.drawn = wanted
+
+
+def fill_map_background(con, game_map, visible, colors):
+    # Pick one of the four colors for every cell at once, and push the whole console background in a single call
+    tiles = game_map.tiles
+    con_width = libtcod.console_get_width(con)
+    con_height = libtcod.console_get_height(con)
+    unexplored = libtcod.console_get_default_background(con)
+
+    palette = np.array([[color.r, color.g, color.b] for color in (unexplored,
+                                                                  colors.get('dark_ground'), colors.get('dark_wall'),
+                                                                  colors.get('light_ground'), colors.get('light_wall'))],
+                       dtype=np.int32)
+
+    # 0 is unexplored, 1 and 2 are dark ground and wall, 3 and 4 are light ground and wall
+    color_index = np.where(visible, 3, np.where(tiles.explored, 1, 0))
+    color_index += (color_index > 0) & tiles.block_sight
+
+    # The console is indexed [y, x] and may be larger than the map
+    background = np.empty((con_height, con_width, 3), dtype=np.int32)
+    background[:] = palette[0]
+    background[:game_map.height, :game_map.width] = palette[color_index.T]
+
+    libtcod.console_fill_background(con, background[..., 0].ravel(), background[..., 1].ravel(),
+                                    background[..., 2].ravel())
+
+
+def draw_tile(con, x, y, visible, wall, colors):
+    if visible:
+        if wall:
+            libtcod.console_set_char_background(con, x, y, colors.get('light_wall'), libtcod.BKGND_SET)
+        else:
+            libtcod.console_set_char_background(con, x, y, colors.get('light_ground'), libtcod.BKGND_SET)
+    else:
+        if wall:
+            libtcod.console_set_char_background(con, x, y, colors.get('dark_wall'), libtcod.BKGND_SET)
+        else:
+            libtcod.console_set_char_background(con, x, y, colors.get('dark_ground'), libtcod.BKGND_SET)
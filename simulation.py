@@ -0,0 +1,240 @@
+"""
+Simulation
+----
+Plays whole games without a window, with a bot at the keyboard instead of a human. The bot's key presses
+go through the real main loop in play_game, so this load-tests the engine and collects performance numbers.
+
+Usage: python simulation.py [games] [--max-turns N] [--seed N]
+"""
+import os
+
+# Always use the headless libtcod backend, even where the native library is available
+os.environ.setdefault('LIBTCOD_HEADLESS', '1')
+
+import argparse
+import re
+import time
+from collections import Counter, deque
+
+import libtcodpy as libtcod
+
+from engine import play_game
+from loader_functions.initialize_new_game import get_constants, get_game_variables
+
+
+# The key to press for each direction, matching handle_player_turn_keys
+MOVE_KEYS = {
+    (0, -1): libtcod.key_event(vk=libtcod.KEY_UP),
+    (0, 1): libtcod.key_event(vk=libtcod.KEY_DOWN),
+    (-1, 0): libtcod.key_event(vk=libtcod.KEY_LEFT),
+    (1, 0): libtcod.key_event(vk=libtcod.KEY_RIGHT),
+    (-1, -1): libtcod.key_event(c='y'),
+    (1, -1): libtcod.key_event(c='u'),
+    (-1, 1): libtcod.key_event(c='b'),
+    (1, 1): libtcod.key_event(c='n')
+}
+
+WAIT_KEY = libtcod.key_event(vk=libtcod.KEY_SPACE)
+STAIRS_KEY = libtcod.key_event(vk=libtcod.KEY_ENTER)
+LEVEL_UP_KEYS = {
+    'hp': libtcod.key_event(c='a'),
+    'str': libtcod.key_event(c='b'),
+    'def': libtcod.key_event(c='c')
+}
+
+KILLER_PATTERN = re.compile(r'^(.+) attacks Player for')
+
+
+class HunterBot:
+    """
+    Walks to the nearest monster it can reach and attacks it. When none are left, or when it is
+    down to half its hp, it goes down the stairs.
+    Bots only need choose_action and choose_level_up, so other policies can be swapped in.
+    """
+    def choose_action(self, player, game_map):
+        # Bump into the nearest monster, or head for the stairs once the floor is cleared.
+        # Badly hurt, it runs for the stairs, as the next floor heals
+        step = None
+
+        if player.fighter.hp * 2 >= player.fighter.max_hp:
+            step = find_first_step(player, game_map, lambda entity: entity.ai is not None)
+
+        if step is None:
+            for entity in game_map.get_entities_at(player.x, player.y):
+                if entity.stairs:
+                    return STAIRS_KEY
+
+            step = find_first_step(player, game_map, lambda entity: entity.stairs is not None)
+
+        if step is None:
+            return WAIT_KEY
+
+        return MOVE_KEYS[step]
+
+    def choose_level_up(self, player):
+        return 'hp'
+
+
+def find_first_step(player, game_map, is_goal):
+    """
+    Breadth-first search from the player to the nearest entity that is_goal accepts.
+    Returns the first step of the way as (dx, dy), or None if no goal can be reached.
+    """
+    blocked = game_map.tiles.blocked
+    start = (player.x, player.y)
+    first_steps = {start: None}
+    frontier = deque([start])
+
+    while frontier:
+        x, y = frontier.popleft()
+
+        for dx, dy in MOVE_KEYS:
+            cell = (x + dx, y + dy)
+
+            if cell in first_steps or not (0 <= cell[0] < game_map.width and 0 <= cell[1] < game_map.height):
+                continue
+
+            if blocked.item(cell):
+                continue
+
+            first_step = first_steps[(x, y)] or (dx, dy)
+            first_steps[cell] = first_step
+            entities = game_map.get_entities_at(*cell)
+
+            if any(is_goal(entity) for entity in entities):
+                return first_step
+
+            # Other monsters are in the way, but the ground under items and stairs can be walked on
+            if not any(entity.blocks for entity in entities):
+                frontier.append(cell)
+
+    return None
+
+
+def bot_input(bot, player, game_map, result, max_turns):
+    """
+    The event source for one game: a key press from the bot every frame until the player dies
+    or runs out of turns. play_game returns once this runs out.
+    """
+    current_level = player.level.current_level
+
+    while player.fighter.hp > 0 and result['turns'] < max_turns:
+        # A level up opens the stat menu, which has to be answered before anything else
+        if player.level.current_level != current_level:
+            current_level = player.level.current_level
+
+            yield LEVEL_UP_KEYS[bot.choose_level_up(player)]
+
+        yield bot.choose_action(player, game_map)
+
+        result['turns'] += 1
+
+
+def get_cause_of_death(player, message_log):
+    if player.fighter.hp > 0:
+        return None
+
+    for message in reversed(message_log.messages):
+        killer = KILLER_PATTERN.match(message.text)
+
+        if killer:
+            return killer.group(1)
+
+    return 'unknown'
+
+
+def run_game(bot, constants, con, panel, max_turns):
+    player, entities, game_map, message_log, game_state = get_game_variables(constants)
+    result = {'turns': 0}
+
+    libtcod.set_event_source(bot_input(bot, player, game_map, result, max_turns))
+
+    start_time = time.time()
+    start_frame = libtcod.get_frame_count()
+
+    play_game(player, entities, game_map, message_log, game_state, con, panel, constants)
+
+    result['seconds'] = time.time() - start_time
+    result['frames'] = libtcod.get_frame_count() - start_frame
+    result['floor'] = game_map.dungeon_level
+    result['level'] = player.level.current_level
+    result['cause_of_death'] = get_cause_of_death(player, message_log)
+
+    return result
+
+
+def run_games(games, bot=None, max_turns=5000, seed=None, constants=None):
+    """
+    Plays a number of games back to back and returns one result dict per game.
+    With a seed, game i is played with the game seed seed + i, so runs can be repeated.
+    """
+    if not libtcod.HEADLESS:
+        raise RuntimeError('simulations need the headless libtcod backend, set LIBTCOD_HEADLESS=1')
+
+    if bot is None:
+        bot = HunterBot()
+
+    if constants is None:
+        constants = get_constants()
+
+        # Simulated games are not worth keeping, and writing them would only slow the runs down
+        constants['autosave_interval'] = 0
+
+    libtcod.console_init_root(constants['screen_width'], constants['screen_height'], constants['window_title'],
+                              False)
+
+    con = libtcod.console_new(constants['screen_width'], constants['screen_height'])
+    panel = libtcod.console_new(constants['screen_width'], constants['panel_height'])
+
+    results = []
+
+    for game in range(games):
+        game_constants = constants
+
+        if seed is not None:
+            game_constants = dict(constants, seed=seed + game)
+
+        results.append(run_game(bot, game_constants, con, panel, max_turns))
+
+    return results
+
+
+def format_report(results):
+    turns = sum(result['turns'] for result in results)
+    seconds = sum(result['seconds'] for result in results)
+    floors = Counter(result['floor'] for result in results)
+    causes = Counter(result['cause_of_death'] or 'survived' for result in results)
+
+    lines = [
+        'Games: {0}'.format(len(results)),
+        'Turns: {0} ({1:.1f} per game)'.format(turns, float(turns) / max(len(results), 1)),
+        'Time: {0:.2f}s ({1:.1f} turns/s, {2:.1f} games/hour)'.format(
+            seconds, turns / max(seconds, 1e-9), len(results) * 3600.0 / max(seconds, 1e-9)),
+        'Floors reached:'
+    ]
+
+    for floor in sorted(floors):
+        lines.append('  {0}: {1}'.format(floor, floors[floor]))
+
+    lines.append('Cause of death:')
+
+    for cause, count in causes.most_common():
+        lines.append('  {0}: {1}'.format(cause, count))
+
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play games headless with a bot and report how they went.')
+    parser.add_argument('games', type=int, nargs='?', default=10)
+    parser.add_argument('--max-turns', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    results = run_games(args.games, max_turns=args.max_turns, seed=args.seed)
+
+    print(format_report(results))
+
+
+if __name__ == '__main__':
+    main()
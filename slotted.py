@@ -0,0 +1,28 @@
+"""
+Slotted
+----
+A base for the classes the game has a lot of instances of, like entities, their components and messages.
+They list their attributes in __slots__, which keeps the instances small and the attribute lookups quick.
+"""
+
+
+class Slotted(object):
+    """
+    Instances pickle as a dict of their attributes, which is also how they pickled before they had __slots__,
+    so old pickles load into the slotted classes and new ones work with any pickle protocol.
+    """
+    __slots__ = ()
+
+    def __getstate__(self):
+        state = {}
+
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
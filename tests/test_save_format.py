@@ -0,0 +1,165 @@
+"""
+Save Format Tests
+----
+Every save game version that can still be read, and the old shelve save game, is loaded and saved again in the
+current version, with a confused monster and the player's dagger and shield equipped.
+The files in tests/data were written by the game at the version they are named after.
+
+Usage: python -m unittest discover tests
+"""
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+import zlib
+
+os.environ.setdefault('LIBTCOD_HEADLESS', '1')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import libtcodpy as libtcod
+from components.ai import BasicMonster, ConfusedMonster
+from components.equippable import Equippable
+from entity import Entity
+from equipment_slots import EquipmentSlots
+from loader_functions.data_loaders import load_game, save_game
+from loader_functions.initialize_new_game import get_constants, get_game_variables
+from loader_functions.save_format import MAGIC, VERSION, SaveFormatError, decode_save, encode_save
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def describe_ai(ai):
+    if isinstance(ai, ConfusedMonster):
+        return 'ConfusedMonster', ai.number_of_turns, describe_ai(ai.previous_ai)
+
+    return type(ai).__name__ if ai else None
+
+
+def describe_entity(entity):
+    # Everything a save game keeps of an entity, with the entities it refers to by name
+    fighter = entity.fighter
+    equipment = entity.equipment
+
+    return (entity.x, entity.y, entity.char, entity.name, entity.blocks, entity.render_order,
+            (fighter.hp, fighter.max_hp, fighter.power, fighter.defense) if fighter else None,
+            describe_ai(entity.ai),
+            [item.name for item in entity.inventory.items] if entity.inventory else None,
+            sorted((slot, item.name) for slot, item in equipment.slots.items()) if equipment else None)
+
+
+def describe_game(player, entities, game_map, message_log):
+    return (entities.index(player), [describe_entity(entity) for entity in entities],
+            game_map.tiles.blocked.tolist(), game_map.tiles.explored.tolist(), game_map.dungeon_level,
+            [message.text for message in message_log.messages])
+
+
+class SaveFormatTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def copy_data(self, name, target):
+        shutil.copy(os.path.join(DATA_DIRECTORY, name), os.path.join(self.directory, target))
+
+    def check_game(self, player, entities, game_map):
+        self.assertIn(player, entities)
+        self.assertIn(player, game_map.get_entities_at(player.x, player.y))
+
+        # The equipped items are the ones in the inventory, not copies of them, and their bonuses are counted
+        dagger = player.equipment.slots[EquipmentSlots.MAIN_HAND]
+        shield = player.equipment.slots[EquipmentSlots.OFF_HAND]
+        self.assertEqual((dagger.name, shield.name), ('Dagger', 'Shield'))
+        self.assertTrue(any(item is dagger for item in player.inventory.items))
+        self.assertTrue(any(item is shield for item in player.inventory.items))
+        self.assertEqual(player.fighter.power, player.fighter.base_power + 2)
+        self.assertEqual(player.fighter.defense, player.fighter.base_defense + 1)
+
+        confused = [entity for entity in entities if isinstance(entity.ai, ConfusedMonster)]
+        self.assertEqual(len(confused), 1)
+
+        monster = confused[0]
+        self.assertEqual(monster.ai.number_of_turns, 7)
+        self.assertIs(monster.ai.owner, monster)
+        self.assertIsInstance(monster.ai.previous_ai, BasicMonster)
+        self.assertIs(monster.ai.previous_ai.owner, monster)
+
+    def check_round_trip(self):
+        player, entities, game_map, message_log, game_state = load_game()
+        self.check_game(player, entities, game_map)
+
+        save_game(player, entities, game_map, message_log, game_state)
+        loaded = load_game()
+        self.check_game(*loaded[:3])
+
+        self.assertEqual(describe_game(*loaded[:4]), describe_game(player, entities, game_map, message_log))
+        self.assertEqual(loaded[4], game_state)
+
+        # The random number streams go on from where they were
+        self.assertEqual(loaded[2].rng.getstate(), game_map.rng.getstate())
+
+    def test_version_1(self):
+        self.copy_data('savegame_v1.sav', 'savegame.sav')
+        self.check_round_trip()
+
+    def test_version_2(self):
+        self.copy_data('savegame_v2.sav', 'savegame.sav')
+        self.check_round_trip()
+
+    def test_version_3(self):
+        constants = get_constants()
+        constants['map_width'] = 30
+        constants['map_height'] = 20
+        constants['seed'] = 7
+
+        player, entities, game_map, message_log, game_state = get_game_variables(constants)
+        monster = [entity for entity in entities if entity.ai][0]
+        monster.ai = ConfusedMonster(monster.ai, 7)
+        monster.ai.owner = monster
+
+        shield = Entity(0, 0, '[', libtcod.darker_orange, 'Shield',
+                        equippable=Equippable(EquipmentSlots.OFF_HAND, defense_bonus=1))
+        player.inventory.add_item(shield)
+        player.equipment.toggle_equip(shield)
+
+        save_game(player, entities, game_map, message_log, game_state)
+        self.check_round_trip()
+
+    def test_shelve(self):
+        for extension in ('.dat', '.dir'):
+            self.copy_data('savegame_shelve' + extension, 'savegame' + extension)
+
+        self.check_round_trip()
+
+    def test_unknown_entity(self):
+        constants = get_constants()
+        constants['seed'] = 7
+        player, entities, game_map, message_log, game_state = get_game_variables(constants)
+
+        data = encode_save(player, entities, game_map, message_log, game_state)
+        body = zlib.decompress(data[len(MAGIC) + 2:])
+
+        # The body ends with the player's id
+        for entity_id in (len(entities) + 10, -5):
+            corrupted = data[:len(MAGIC) + 2] + zlib.compress(body[:-4] + struct.pack('<i', entity_id))
+            self.assertRaises(SaveFormatError, decode_save, corrupted)
+
+    def test_unsupported_version(self):
+        self.copy_data('savegame_v1.sav', 'savegame.sav')
+
+        with open('savegame.sav', 'rb') as save_file:
+            data = save_file.read()
+
+        data = MAGIC + struct.pack('<H', VERSION + 1) + data[len(MAGIC) + 2:]
+        self.assertRaises(SaveFormatError, decode_save, data)
+
+
+if __name__ == '__main__':
+    unittest.main()
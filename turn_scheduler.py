@@ -0,0 +1,127 @@
+"""
+Turn Scheduler
+----
+Decides who acts next on the enemy turn. Only the actors, the entities with an AI, are kept, in a heap
+ordered by the time of their next action. Faster entities come around again sooner, so they act more often.
+Actors far from the player can be put to sleep, and then cost nothing until they are woken up.
+"""
+import heapq
+
+
+NORMAL_SPEED = 100
+
+# Size of the square regions sleeping actors are grouped by
+DORMANT_REGION_SIZE = 16
+
+
+def get_action_time(entity):
+    # How long one action takes, in turns of an entity moving at normal speed
+    return float(NORMAL_SPEED) / entity.speed
+
+
+class TurnScheduler:
+    def __init__(self, entities=()):
+        self.time = 0.0
+        self.queue = []
+        self.entries = {}
+        self.counter = 0
+
+        for entity in entities:
+            if entity.ai:
+                self.add(entity)
+
+    def add(self, entity, delay=0.0):
+        # The counter keeps actors that are due at the same time in the order they were added
+        self.remove(entity)
+
+        entry = [self.time + delay, self.counter, entity]
+        self.counter += 1
+
+        self.entries[entity] = entry
+        heapq.heappush(self.queue, entry)
+
+    def remove(self, entity):
+        # The entry stays in the heap, but is skipped when it comes up
+        entry = self.entries.pop(entity, None)
+
+        if entry:
+            entry[2] = None
+
+    def take_turns(self, duration):
+        """
+        Yield, in order, every actor whose action is due in the next duration turns.
+        Each actor is scheduled again before it is handed out, so a fast one can come up more than once.
+        Entities that lost their AI, like dead monsters, are dropped when they come up.
+        """
+        end_time = self.time + duration
+
+        while self.queue and self.queue[0][0] < end_time:
+            time, counter, entity = heapq.heappop(self.queue)
+
+            if entity is None:
+                continue
+
+            if not entity.ai:
+                del self.entries[entity]
+                continue
+
+            self.time = time
+            self.add(entity, get_action_time(entity))
+
+            yield entity
+
+        self.time = end_time
+
+    def actors(self):
+        # In the order they act, which unlike the order of the entries dict does not depend on where
+        # in memory the entities happen to be
+        return [entry[2] for entry in sorted(self.entries.values())]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DormantMonsters:
+    """
+    Sleeping actors, grouped by the region of the map they are in,
+    so waking the ones near a point only looks at the few regions around it.
+    """
+    def __init__(self):
+        self.regions = {}
+        self.entity_regions = {}
+
+    def add(self, entity):
+        region = (entity.x // DORMANT_REGION_SIZE, entity.y // DORMANT_REGION_SIZE)
+
+        self.regions.setdefault(region, []).append(entity)
+        self.entity_regions[entity] = region
+
+    def remove(self, entity):
+        region = self.entity_regions.pop(entity, None)
+
+        if region is not None:
+            self.regions[region].remove(entity)
+
+    def pop_near(self, x, y, radius):
+        # Take out and return the sleepers within radius of (x, y). Dead ones are dropped on the way.
+        woken = []
+
+        for region_x in range(max(x - radius, 0) // DORMANT_REGION_SIZE, (x + radius) // DORMANT_REGION_SIZE + 1):
+            for region_y in range(max(y - radius, 0) // DORMANT_REGION_SIZE,
+                                  (y + radius) // DORMANT_REGION_SIZE + 1):
+                sleepers = self.regions.get((region_x, region_y))
+
+                if not sleepers:
+                    continue
+
+                for entity in sleepers[:]:
+                    if not entity.ai or (entity.x - x) ** 2 + (entity.y - y) ** 2 <= radius * radius:
+                        self.remove(entity)
+
+                        if entity.ai:
+                            woken.append(entity)
+
+        return woken
+
+    def __len__(self):
+        return len(self.entity_regions)